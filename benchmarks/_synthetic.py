@@ -0,0 +1,132 @@
+"""
+seeded synthetic inputs for the benchmarks: strava edge-hour tables with an edge
+shapefile (the layout of data/strava/), and panels shaped like data/panel_weekly.parquet
+"""
+
+from pathlib import Path
+
+import duckdb
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from src._panel import PANEL_DTYPES, UNIT_TYPE
+
+
+# friedrichstrasse, the center of the grid built by 1_hexagons.py
+CENTER_LON, CENTER_LAT = 13.3894960, 52.5127061
+
+
+# -- STRAVA --
+def strava_edges(n_edges, extent_km=30, seed=0):
+    """Street-like edges (20-200 m segments) around the grid center, denser downtown.
+
+    extent_km is the side of the square they cover, in web mercator units like the grid.
+    Returns a GeoDataFrame with edgeUID in EPSG:4326, as in strava_map.shp.
+    """
+    rng = np.random.default_rng(seed)
+    cx, cy = shapely.get_coordinates(
+        gpd.GeoSeries.from_xy([CENTER_LON], [CENTER_LAT], crs="EPSG:4326").to_crs("EPSG:3857")
+    )[0]
+    half = extent_km * 500
+
+    # half uniform over the city, half clustered around the center
+    n_core = n_edges // 2
+
+    def coords():
+        uniform = rng.uniform(-half, half, n_edges - n_core)
+        return np.clip(np.concatenate([uniform, rng.normal(0, half / 4, n_core)]), -half, half)
+
+    x, y = cx + coords(), cy + coords()
+
+    length = rng.uniform(20, 200, n_edges)
+    angle = rng.uniform(0, np.pi, n_edges)
+    dx, dy = length / 2 * np.cos(angle), length / 2 * np.sin(angle)
+    lines = shapely.linestrings(
+        np.stack([np.stack([x - dx, y - dy], axis=1), np.stack([x + dx, y + dy], axis=1)], axis=1)
+    )
+    return gpd.GeoDataFrame(
+        {"edgeUID": np.arange(n_edges, dtype=np.int64) + 1}, geometry=lines, crs="EPSG:3857"
+    ).to_crs("EPSG:4326")
+
+
+def write_strava(
+    data_dir,
+    n_edges,
+    n_rows,
+    extent_km=30,
+    start="2021-11-01",
+    end="2024-12-31",
+    seed=0,
+    chunk_rows=1_000_000,
+):
+    """Write strava_map.shp and a strava.duckdb `data` table of n_rows edge-hour rows.
+
+    Edge popularity is lognormal, so a few edges carry most rows, as in the real data.
+    Rows are generated and inserted in chunks, so n_rows is not limited by memory.
+    """
+    strava_dir = Path(data_dir) / "strava"
+    strava_dir.mkdir(parents=True, exist_ok=True)
+    edges = strava_edges(n_edges, extent_km, seed)
+    edges.to_file(strava_dir / "strava_map.shp")
+
+    rng = np.random.default_rng(seed + 1)
+    popularity = rng.lognormal(0, 1.5, n_edges)
+    popularity /= popularity.sum()
+    hours = pd.date_range(start, end, freq="h").strftime("%Y-%m-%dT%H").to_numpy(dtype=object)
+
+    db_path = strava_dir / "strava.duckdb"
+    db_path.unlink(missing_ok=True)
+    conn = duckdb.connect(str(db_path))
+    conn.execute(
+        "CREATE TABLE data (edge_uid BIGINT, hour VARCHAR, total_trip_count INTEGER)"
+    )
+    for first in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - first)
+        chunk = pd.DataFrame(
+            {
+                "edge_uid": edges["edgeUID"].values[rng.choice(n_edges, n, p=popularity)],
+                "hour": hours[rng.integers(0, len(hours), n)],
+                "total_trip_count": 1 + rng.poisson(2, n).astype(np.int32),
+            }
+        )
+        conn.register("chunk", chunk)
+        conn.execute("INSERT INTO data SELECT * FROM chunk")
+        conn.unregister("chunk")
+    conn.close()
+    return edges
+
+
+# -- PANELS --
+def synthetic_panel(n_units, n_weeks, n_pre=None, effect=0.1, excluded_share=0.05, seed=0):
+    """(hex_id, time, trips, unit_type) panel in the compact schema of 3_panel.py.
+
+    Trips are poisson draws around a low-rank factor model (unit level times a yearly
+    cycle and a trend); unit 0 is treated and its mean rises by `effect` from time 0.
+    Time runs from -n_pre (default: a third of the weeks) to n_weeks - n_pre - 1.
+    """
+    rng = np.random.default_rng(seed)
+    n_pre = n_weeks // 3 if n_pre is None else n_pre
+    t = np.arange(n_weeks)
+    factors = np.stack(
+        [np.sin(2 * np.pi * t / 52), np.cos(2 * np.pi * t / 52), t / n_weeks - 0.5]
+    )
+    level = rng.lognormal(3, 1, n_units)
+    loadings = rng.normal(0, [0.3, 0.3, 0.4], (n_units, 3))
+    mean = level[:, None] * np.clip(1 + loadings @ factors, 0.05, None)
+    mean[0, n_pre:] *= 1 + effect
+    trips = rng.poisson(mean).astype(np.float32)
+
+    codes = np.ones(n_units, dtype=np.int8)  # donor
+    codes[rng.random(n_units) < excluded_share] = 2
+    codes[0] = 0
+
+    return pd.DataFrame(
+        {
+            "hex_id": np.repeat(np.arange(n_units, dtype=PANEL_DTYPES["hex_id"]), n_weeks),
+            "time": np.tile((t - n_pre).astype(PANEL_DTYPES["time"]), n_units),
+            "trips": trips.ravel(),
+            "unit_type": pd.Categorical.from_codes(np.repeat(codes, n_weeks), dtype=UNIT_TYPE),
+        }
+    )
@@ -0,0 +1,358 @@
+"""
+benchmark suite on seeded synthetic inputs (benchmarks/_synthetic.py): hex grid
+construction (1_hexagons.py) and panel aggregation (3_panel.py) on a city-scale strava
+network, scm / ascm fits, the placebo loop and figure rendering on panels of up to
+100k units x 1,000 weeks; every case runs in a fresh process, and its wall time,
+throughput and peak rss are compared against benchmarks/baseline.json
+usage: python benchmarks/bench_pipeline.py [case ...] [--panels 1000x150 ...]
+           [--strava-rows N] [--repeat N] [--workdir DIR] [--update-baseline]
+exits with status 1 if a case is slower or larger than its baseline by more than
+--tolerance; timings are only comparable on the machine the baseline was recorded on
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+
+from src._ascm import fit_ascm
+from src._instrument import peak_rss_mb
+from src._panel import load_wide, to_wide, write_wide
+from src._placebo import placebo_outputs, run_placebos
+from src._results import complete_run, model_tables, write_tables
+
+
+# -- PARAMETERS --
+BASELINE_PATH = ROOT / "benchmarks" / "baseline.json"
+CITY_CASES = ["hexagons", "panel"]  # on the synthetic strava network
+PANEL_CASES = ["scm", "ascm", "placebos", "figures"]  # on each synthetic panel
+SCRIPT_CASES = ["hexagons", "panel", "figures"]  # time a pipeline script in a subprocess
+PANEL_SIZES = ["1000x150", "1000x1000", "10000x520", "100000x150"]  # units x weeks
+STRAVA_EDGES = 50_000
+STRAVA_ROWS = 5_000_000  # edge-hour rows
+EXTENT_KM = 30  # side of the synthetic city, about the extent of the shipped grid
+N_PLACEBO = 8  # placebo fits timed per panel
+PLACEBO_WORKERS = None  # None = one per cpu
+MAX_GRAM_GB = 2.0  # the batched placebo solver holds a units x units gram per worker
+FIGURE_DONORS = 50  # donors (and placebos) behind the rendered figures
+FIGURES = ["scm_results", "ascm_results", "ascm_placebo"]  # the maps need basemap tiles
+REPEAT = 3
+TOLERANCE = 0.25  # slower / larger than the baseline by more than this = regression
+SEED = 42
+
+
+# -- SETUP (untimed) --
+def _script(workdir, script, *args, report=None):
+    """Run a pipeline script with workdir as its project root; return its wall time."""
+    env = dict(os.environ, MPLBACKEND="Agg")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    if report is not None:
+        env["RUN_REPORT"] = str(report)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(ROOT / script), *args],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{script} failed:\n{result.stderr}")
+    return time.perf_counter() - start
+
+
+def prepare_city(workdir, n_edges, n_rows):
+    """Synthetic strava data, hex grid and partitioned parquet in workdir (kept if unchanged)."""
+    spec = {"edges": n_edges, "rows": n_rows, "extent_km": EXTENT_KM, "seed": SEED}
+    spec_path = workdir / "city.json"
+    if spec_path.exists() and json.loads(spec_path.read_text()) == spec:
+        return
+    # the generators import geopandas and duckdb, which stay out of the measured processes
+    from _synthetic import write_strava
+
+    print(f"generating {n_rows:,} edge-hour rows on {n_edges:,} edges")
+    data_dir = workdir / "data"
+    shutil.rmtree(data_dir, ignore_errors=True)
+    write_strava(data_dir, n_edges, n_rows, EXTENT_KM, seed=SEED)
+    _script(workdir, "src/1_hexagons.py")
+    # 3_panel.py only reads the features file, so the hex ids are enough
+    hex_ids = pd.read_parquet(data_dir / "berlin_hexagons.parquet", columns=["hex_id"])
+    hex_ids.to_csv(data_dir / "hex_osm_features.csv", index=False)
+    # the first run also converts the raw table to partitioned parquet
+    _script(workdir, "src/3_panel.py")
+    spec_path.write_text(json.dumps(spec))
+
+
+def _panel_path(workdir, size):
+    return workdir / "panels" / f"panel_{size}_wide"
+
+
+def prepare_panel(workdir, size):
+    """Synthetic panel of size "<units>x<weeks>" as a wide matrix in workdir."""
+    path = _panel_path(workdir, size)
+    if (path / "unit_types.json").exists():
+        return
+    from _synthetic import synthetic_panel
+
+    print(f"generating panel {size}")
+    n_units, n_weeks = map(int, size.split("x"))
+    write_wide(to_wide(synthetic_panel(n_units, n_weeks, seed=SEED)), path)
+
+
+def _load(workdir, size):
+    """(donor outcomes, treated outcomes, pre-period mask) of a synthetic panel."""
+    panel = load_wide(_panel_path(workdir, size))
+    Y0 = panel.trips[panel.rows("donor")].astype(float)
+    y1 = panel.trips[panel.rows("treated")][0].astype(float)
+    return Y0, y1, panel.time < 0
+
+
+def prepare_models(workdir, size):
+    """Model outputs the figures read, from a donor subsample as in TEST mode of 4_ascm.py."""
+    marker = workdir / "models" / "panel.txt"
+    if marker.exists() and marker.read_text() == size:
+        return
+    print(f"fitting models for the figures of panel {size}")
+    Y0, y1, pre = _load(workdir, size)
+    sample = np.sort(np.random.default_rng(SEED).choice(len(Y0), FIGURE_DONORS, replace=False))
+    Y0 = Y0[sample]
+    times = np.arange(len(pre)) - pre.sum()
+    models = marker.parent
+    models.mkdir(exist_ok=True)
+    fits = {}
+    for model_name, progfunc in [("scm", "none"), ("ascm", "ridge")]:
+        fit = fits[model_name] = fit_ascm(Y0, y1, pre, progfunc=progfunc)
+        write_tables(model_tables(fit, times, y1, sample, -1, pre), models, model_name, "bench")
+    gaps = run_placebos(np.vstack([Y0, y1]), np.append(sample, -1), sample, pre)
+    trajectories, summary = placebo_outputs(gaps, -1, fits["ascm"].att, times, pre)
+    write_tables(
+        {"placebo_trajectories": trajectories, "placebo_summary": summary}, models, "ascm", "bench"
+    )
+    complete_run(models, "bench", ["scm", "ascm"])
+    marker.write_text(size)
+
+
+# -- CASES (each runs in a fresh process; returns seconds, throughput and its unit) --
+def _timed_script(workdir, script):
+    """Run a script and return {section: seconds} from its run report."""
+    report = workdir / "report.json"
+    _script(workdir, script, report=report)
+    with open(report) as f:
+        return {s["section"]: s["wall_s"] for s in json.load(f)["sections"]}
+
+
+def case_hexagons(workdir, size):
+    sections = _timed_script(workdir, "src/1_hexagons.py")
+    hexagons = pd.read_parquet(workdir / "data" / "berlin_hexagons.parquet", columns=["hex_id"])
+    n_hexes = len(hexagons)
+    seconds = sections["build_grid"]
+    return {"seconds": seconds, "throughput": n_hexes / seconds, "unit": "hexes/s"}
+
+
+def case_panel(workdir, size):
+    # hex-edge mapping, the duckdb aggregation and the panel save (not interpreter startup)
+    sections = _timed_script(workdir, "src/3_panel.py")
+    seconds = sum(sections.values())
+    n_rows = json.loads((workdir / "city.json").read_text())["rows"]
+    return {"seconds": seconds, "throughput": n_rows / seconds, "unit": "rows/s"}
+
+
+def _case_fit(progfunc):
+    def case(workdir, size):
+        Y0, y1, pre = _load(workdir, size)
+        start = time.perf_counter()
+        fit_ascm(Y0, y1, pre, progfunc=progfunc)
+        seconds = time.perf_counter() - start
+        return {"seconds": seconds, "throughput": Y0.size / seconds, "unit": "cells/s"}
+
+    return case
+
+
+def case_placebos(workdir, size):
+    Y0, y1, pre = _load(workdir, size)
+    n_units = len(Y0) + 1
+    if n_units**2 * 8 / 1e9 > MAX_GRAM_GB:
+        return {"skipped": f"{n_units} x {n_units} gram exceeds MAX_GRAM_GB"}
+    Y = np.vstack([Y0, y1])
+    units = np.arange(n_units)
+    placebo_units = np.random.default_rng(SEED).choice(len(Y0), N_PLACEBO, replace=False)
+
+    start = time.perf_counter()
+    run_placebos(Y, units, placebo_units, pre, max_workers=PLACEBO_WORKERS)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "throughput": N_PLACEBO / seconds, "unit": "placebos/s"}
+
+
+def case_figures(workdir, size):
+    seconds = _script(workdir, "src/report.py", *FIGURES)
+    return {"seconds": seconds, "throughput": len(FIGURES) / seconds, "unit": "figures/s"}
+
+
+CASES = {
+    "hexagons": case_hexagons,
+    "panel": case_panel,
+    "scm": _case_fit("none"),
+    "ascm": _case_fit("ridge"),
+    "placebos": case_placebos,
+    "figures": case_figures,
+}
+
+
+def child(case, size, workdir):
+    """Run one case in this (fresh) process and print its result as json."""
+    result = CASES[case](Path(workdir), size)
+    # script cases measure the script; the others this process and its pool workers
+    children = peak_rss_mb(children=True) or 0
+    result["peak_rss_mb"] = children if case in SCRIPT_CASES else max(peak_rss_mb(), children)
+    print(json.dumps(result))
+
+
+# -- RUNNER --
+def run_case(case, size, workdir, repeat):
+    """Median seconds / throughput and max peak rss of `repeat` fresh-process runs."""
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", case, size, "--workdir", str(workdir)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{case}@{size} failed:\n{result.stderr}")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        if "skipped" in runs[-1]:
+            return runs[-1]
+    return {
+        "seconds": round(statistics.median(r["seconds"] for r in runs), 4),
+        "throughput": round(statistics.median(r["throughput"] for r in runs), 3),
+        "unit": runs[0]["unit"],
+        "peak_rss_mb": max(r["peak_rss_mb"] or 0 for r in runs),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print every case against its baseline; return the keys that regressed."""
+    regressed = []
+    print(f"{'case':<22} {'seconds':>9} {'vs base':>8} {'peak MB':>8} {'vs base':>8}  throughput")
+    for key, r in results.items():
+        if "skipped" in r:
+            print(f"{key:<22} skipped: {r['skipped']}")
+            continue
+        base = baseline.get(key)
+        time_ratio = r["seconds"] / base["seconds"] if base else None
+        rss_ratio = r["peak_rss_mb"] / base["peak_rss_mb"] if base else None
+        slow = base is not None and (time_ratio > 1 + tolerance or rss_ratio > 1 + tolerance)
+        if slow:
+            regressed.append(key)
+        print(
+            f"{key:<22} {r['seconds']:>8.3f}s "
+            + (f"{time_ratio:>7.2f}x " if base else f"{'new':>8} ")
+            + f"{r['peak_rss_mb']:>8.0f} "
+            + (f"{rss_ratio:>7.2f}x " if base else f"{'new':>8} ")
+            + f" {r['throughput']:,.{0 if r['throughput'] >= 100 else 2}f} {r['unit']}"
+            + ("  REGRESSION" if slow else "")
+        )
+    return regressed
+
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def commit():
+    """Commit of the benchmarked code (suffixed -dirty with local changes), None without git."""
+    result = subprocess.run(
+        ["git", "describe", "--always", "--dirty", "--abbrev=7"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark suite on synthetic inputs")
+    parser.add_argument("cases", nargs="*", help=f"subset of {', '.join(CASES)}")
+    parser.add_argument("--panels", nargs="+", default=PANEL_SIZES, help="<units>x<weeks>")
+    parser.add_argument("--strava-rows", type=int, default=STRAVA_ROWS)
+    parser.add_argument("--strava-edges", type=int, default=STRAVA_EDGES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--workdir", help="keep generated inputs here (default: temporary)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, args.workdir)
+        return
+
+    cases = args.cases or list(CASES)
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        # the figures read the grid of the synthetic city
+        if set(cases) & {"hexagons", "panel", "figures"}:
+            prepare_city(workdir, args.strava_edges, args.strava_rows)
+
+        results = {}
+        for case in cases:
+            if case in CITY_CASES:
+                sizes = [f"{args.strava_rows}rows" if case == "panel" else f"{EXTENT_KM}km"]
+            else:
+                sizes = args.panels
+            for size in sizes:
+                if case in PANEL_CASES:
+                    prepare_panel(workdir, size)
+                if case == "figures":
+                    prepare_models(workdir, size)
+                print(f"running {case}@{size}")
+                results[f"{case}@{size}"] = run_case(case, size, workdir, args.repeat)
+
+    baseline = {"machine": None, "results": {}}
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    if baseline["machine"] not in (None, machine()):
+        print("note: the baseline was recorded on a different machine")
+    regressed = compare(results, baseline["results"], args.tolerance)
+
+    if args.update_baseline:
+        baseline["machine"] = machine()
+        # each case notes the code it was measured on, as later runs update only some cases
+        recorded = commit()
+        baseline["results"].update(
+            {k: {**r, "commit": recorded} for k, r in results.items() if "skipped" not in r}
+        )
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline updated: {BASELINE_PATH.relative_to(ROOT)}")
+    elif regressed:
+        sys.exit(f"regressed: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+wall time of the report entry point (src/report.py) against the previous
+sequence of four interpreters (5a, 5b, 5c, 5d), each run cold in a subprocess
+usage: python benchmarks/bench_report.py [--repeat N] [--offline]
+--offline skips the donor maps, which need basemap tiles
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = [
+    "src/5a_plot_results.py",
+    "src/5b_plot_placebo.py",
+    "src/5c_plot_donor_map.py",
+    "src/5d_table_cov.py",
+]
+OFFLINE_FIGURES = ["scm_results", "ascm_results", "ascm_placebo", "donor_table"]
+
+
+def _run(args):
+    env = dict(os.environ, MPLBACKEND="Agg")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def sequential(offline):
+    scripts = [s for s in SCRIPTS if not (offline and "5c" in s)]
+    return sum(_run([script]) for script in scripts)
+
+
+def report(offline):
+    return _run(["src/report.py", *(OFFLINE_FIGURES if offline else [])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark report rendering")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--offline", action="store_true")
+    args = parser.parse_args()
+
+    if not (ROOT / "models" / "results" / "weights" / "model=ascm").exists():
+        sys.exit("models/ is empty: run src/4_ascm.py first")
+
+    timings = {"four processes": [], "report.py": []}
+    for _ in range(args.repeat):
+        timings["four processes"].append(sequential(args.offline))
+        timings["report.py"].append(report(args.offline))
+
+    base = statistics.median(timings["four processes"])
+    for name, values in timings.items():
+        median = statistics.median(values)
+        print(f"{name:>15}: median {median:6.2f}s  min {min(values):6.2f}s  x{base / median:.2f}")
+
+
+if __name__ == "__main__":
+    main()
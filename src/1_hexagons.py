@@ -1,15 +1,41 @@
 """
 creates hexagonal grid centered on friedrichstr.
-output: data/berlin_hexagons.parquet
+output: data/berlin_hexagons.parquet, data/berlin_hexagons.json,
+        data/radius_sweep/berlin_hexagons_<r>m.{parquet,json} for each of SWEEP_RADII
 """
 
 import geopandas as gpd
-from shapely.geometry import Polygon
 import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon
+from src._hexgrid import (
+    hex_grid,
+    point_to_cell,
+    ring_distance,
+    save_grid_params,
+    sweep_paths,
+    within_zones,
+)
+from src._instrument import section
 
 
 # -- PARAMETERS --
 HEX_RADIUS = 500
+SWEEP_RADII = []  # extra grids for spatial sensitivity runs, e.g. [250, 500, 1000]
+
+# donor-pool exclusions: hexes within k rings / X m of the treated hex, and hexes
+# within buffer_m of any zone (EPSG:4326 WKT); distance 0 = intersecting
+TREATED_RINGS = 1  # 1 = queen contiguity
+TREATED_BUFFER_M = 0  # 0 = only the rings
+EXCLUDE_ZONES = [
+    {
+        "name": "kantstrasse",
+        "geometry": "POLYGON ((13.307318 52.504083, 13.3315946 52.504083, "
+        "13.3315946 52.5073198, 13.307318 52.5073198, 13.307318 52.504083))",
+        "buffer_m": 0,
+    },
+]
+EXCLUDE_ZONES_PATH = None  # csv catalog of further zones (name, geometry, buffer_m)
 
 # -- CONFIG --
 friedrichstr_coords = [
@@ -38,70 +64,55 @@ gdf = gdf.to_crs("EPSG:3857")
 minx, miny, maxx, maxy = gdf.total_bounds
 
 
-# -- CREATE HEXAGONAL GRID --
-dx = HEX_RADIUS * 1.5
-dy = HEX_RADIUS * np.sqrt(3)
-
-col_range = int((max(abs(center_x - minx), abs(maxx - center_x)) / dx) + 2)
-row_range = int((max(abs(center_y - miny), abs(maxy - center_y)) / dy) + 2)
-
-hexagons = []
-
-for col in range(-col_range, col_range):
-    y_offset = dy / 2 if col % 2 == 1 else 0
-
-    for row in range(-row_range, row_range):
-        cx = center_x + col * dx
-        cy = center_y + row * dy + y_offset
-
-        angles = np.linspace(0, 2 * np.pi, 7)
-        x = cx + HEX_RADIUS * np.cos(angles)
-        y = cy + HEX_RADIUS * np.sin(angles)
-        hex_poly = Polygon(zip(x, y))
+# -- EXCLUSION ZONES --
+zones = pd.DataFrame(EXCLUDE_ZONES, columns=["name", "geometry", "buffer_m"])
+if EXCLUDE_ZONES_PATH is not None:
+    zones = pd.concat([zones, pd.read_csv(EXCLUDE_ZONES_PATH)], ignore_index=True)
+zone_geoms = gpd.GeoSeries.from_wkt(zones["geometry"], crs="EPSG:4326").to_crs("EPSG:3857")
+zone_buffers = zones["buffer_m"].fillna(0).to_numpy(dtype=float)
 
-        if (
-            cx >= minx - HEX_RADIUS
-            and cx <= maxx + HEX_RADIUS
-            and cy >= miny - HEX_RADIUS
-            and cy <= maxy + HEX_RADIUS
-        ):
-            hexagons.append(hex_poly)
 
-hex_gdf = gpd.GeoDataFrame({"geometry": hexagons}, crs="EPSG:3857")
-hex_gdf["hex_id"] = range(len(hex_gdf))
+def build_grid(radius):
+    """Hexagonal grid at radius with treated / excluded / donor unit types."""
+    # -- CREATE HEXAGONAL GRID --
+    hex_gdf = hex_grid(center_x, center_y, (minx, miny, maxx, maxy), radius)
+    centroids = hex_gdf.geometry.centroid
+    cols, rows = point_to_cell(centroids.x.values, centroids.y.values, center_x, center_y, radius)
 
+    # -- IDENTIFY TREATED HEX AND ASSIGN UNIT TYPES --
+    # the grid is centered on friedrichstr., so rings count outward from the treated hex
+    rings = ring_distance(cols, rows, *point_to_cell(center_x, center_y, center_x, center_y, radius))
+    treated = rings == 0
 
-# -- IDENTIFY TREATED HEX AND ASSIGN UNIT TYPES --
-treated_hex_gdf = hex_gdf[hex_gdf.geometry.contains(friedrichstr_center)]
+    # all zones plus the treated buffer in one bulk query; rings in closed form
+    geoms = hex_gdf.geometry.values
+    excluded = (rings <= TREATED_RINGS) | within_zones(
+        geoms,
+        np.append(zone_geoms.values, geoms[treated]),
+        np.append(zone_buffers, TREATED_BUFFER_M),
+    )
 
-# Default assignment
-hex_gdf["unit_type"] = "donor"
-
-
-# -- EXCLUDE KANTSTRASSE AREA --
-bbox_kant = (13.307318, 52.504083, 13.3315946, 52.5073198)  # minx, miny, maxx, maxy
-kant_polygon = Polygon(
-    [
-        (bbox_kant[0], bbox_kant[1]),
-        (bbox_kant[2], bbox_kant[1]),
-        (bbox_kant[2], bbox_kant[3]),
-        (bbox_kant[0], bbox_kant[3]),
-        (bbox_kant[0], bbox_kant[1]),
-    ]
-)
-
-kant_geom = gpd.GeoSeries([kant_polygon], crs="EPSG:4326").to_crs(hex_gdf.crs).iloc[0]
-hex_gdf.loc[hex_gdf.geometry.intersects(kant_geom), "unit_type"] = "excluded"
-
-treated_id = treated_hex_gdf["hex_id"].iloc[0]
-treated_geom = treated_hex_gdf.geometry.iloc[0]
-
-# Exclude adjacent hexes (queen contiguity)
-hex_gdf.loc[hex_gdf.geometry.touches(treated_geom), "unit_type"] = "excluded"
-
-# Mark treated last
-hex_gdf.loc[hex_gdf["hex_id"] == treated_id, "unit_type"] = "treated"
+    hex_gdf["unit_type"] = "donor"
+    hex_gdf.loc[excluded, "unit_type"] = "excluded"
+    hex_gdf.loc[treated, "unit_type"] = "treated"
+    return hex_gdf
 
 
 # -- SAVE --
+with section("build_grid", radius=HEX_RADIUS) as s:
+    hex_gdf = build_grid(HEX_RADIUS)
+    s["rows"] = len(hex_gdf)
 hex_gdf.to_crs("EPSG:4326").to_parquet("data/berlin_hexagons.parquet")
+
+# grid parameters for closed-form point -> hex lookup (see src/_hexgrid.HexIndex)
+save_grid_params("data/berlin_hexagons.json", center_x, center_y, HEX_RADIUS)
+
+# -- RADIUS SWEEP --
+for radius in SWEEP_RADII:
+    hexagons_path, params_path = sweep_paths(radius)
+    hexagons_path.parent.mkdir(parents=True, exist_ok=True)
+    with section("build_grid", radius=radius) as s:
+        sweep_gdf = build_grid(radius)
+        s["rows"] = len(sweep_gdf)
+    sweep_gdf.to_crs("EPSG:4326").to_parquet(hexagons_path)
+    save_grid_params(params_path, center_x, center_y, radius)
@@ -1,16 +1,22 @@
 """
-downloads features from OHSOME API
+downloads features from OHSOME API (or computes them from a local osm.pbf extract)
 output: data/hex_osm_features.csv
 """
 
-import requests
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
+from src._instrument import section
+from src._ohsome import OhsomeClient, format_bpolys, spatial_chunks
+from src._osm_pbf import features_from_pbf
 
 
 # -- PARAMETERS --
+BACKEND = "ohsome"  # "ohsome" (api.ohsome.org) or "pbf" (local extract, needs osmium)
 TIMESTAMP = "2021-09-01"  # date for OHSOME API queries
+PBF_PATH = "data/osm/berlin.osm.pbf"  # local extract for BACKEND = "pbf"
+MAX_WORKERS = 4  # concurrent OHSOME requests
+CHUNK_SIZE = 500  # hexagons per bpolys request
 
 
 # -- LOAD HEXAGONS --
@@ -43,16 +49,11 @@ hex_geoms["dist_alexanderplatz_m"] = hex_geoms_meters.geometry.centroid.distance
 
 
 # -- FORMAT BPOLYS --
-def format_bpolys(gdf):
-    polys = []
-    for idx, row in gdf.iterrows():
-        coords = list(row.geometry.exterior.coords)
-        coord_str = ",".join([f"{lon},{lat}" for lon, lat in coords])
-        polys.append(f"{row['hex_id']}:{coord_str}")
-    return "|".join(polys)
-
-
-bpolys_str = format_bpolys(hex_geoms)
+# hexagons are split into spatially compact batches so no request exceeds payload limits
+if BACKEND == "ohsome":
+    bpolys_chunks = [
+        format_bpolys(chunk) for chunk in spatial_chunks(hex_geoms, CHUNK_SIZE)
+    ]
 
 
 # -- ALL QUERIES --
@@ -129,25 +130,19 @@ queries = {
 
 
 # -- EXECUTE QUERIES --
-all_results = []
-
-for name, config in queries.items():
-    url = f"https://api.ohsome.org/v1/elements/{config['endpoint']}/groupBy/boundary"
-
-    response = requests.post(
-        url, data={"bpolys": bpolys_str, "time": TIMESTAMP, "filter": config["filter"]}
-    )
+if BACKEND == "pbf":
+    # same filters, evaluated locally in one pass over the extract
+    with section("pbf_features", queries=len(queries)) as s:
+        all_results = features_from_pbf(PBF_PATH, hex_geoms, queries)
+        s["rows"] = len(hex_geoms)
+else:
+    # one request per (query, chunk); responses are cached on disk, so re-runs
+    # only fetch queries and chunks that changed (each is timed in the run report)
+    client = OhsomeClient(max_workers=MAX_WORKERS)
+    all_results = client.fetch_features(queries, TIMESTAMP, bpolys_chunks)
 
-    if response.status_code == 200:
-        data = response.json()["groupByResult"]
-        feature_dict = {
-            int(item["groupByObject"]): item["result"][0]["value"] for item in data
-        }
-        all_results.append(pd.Series(feature_dict, name=name))
-        print(f"  Got data for {len(feature_dict)} hexagons")
-    else:
-        print(f"  ERROR: {response.status_code}")
-        print(f"  {response.text[:300]}")
+for feature in all_results:
+    print(f"  {feature.name}: got data for {len(feature)} hexagons")
 
 
 # -- BUILD DATAFRAME --
@@ -170,4 +165,5 @@ features_df["has_bus"] = (features_df["n_bus_stops"] > 0).astype(int)
 
 
 # -- SAVE --
-features_df.to_csv("data/hex_osm_features.csv", index=False)
+with section("save", outputs=["data/hex_osm_features.csv"], rows=len(features_df)):
+    features_df.to_csv("data/hex_osm_features.csv", index=False)
@@ -1,86 +1,225 @@
 """
-creates weekly panel for synthetic control
-output: data/panel_weekly.parquet
+creates panels for synthetic control (weekly by default; daily, monthly or custom
+bin widths via RESOLUTIONS, all binned from one cached hex x day aggregate; other
+hex radii via SWEEP_RADII, all aggregated from one cached edge x day scan)
+output: data/panel_weekly.parquet, data/panel_weekly_state.json, data/hex_edge_map.parquet,
+        data/panel_weekly_wide/ (float32 units x weeks matrix + index arrays, memory-mappable),
+        data/hex_daily.parquet, data/panel_{daily,monthly,<n>d}.parquet (+ _wide/) if requested,
+        data/strava/edge_daily.parquet, data/radius_sweep/panel_*_<r>m.parquet (+ _wide/) if sweeping
 """
 
 import geopandas as gpd
 import pandas as pd
 import duckdb
+from pathlib import Path
+from src._hexgrid import SWEEP_DIR, HexIndex, load_grid_params, sweep_paths
+from src._instrument import section
+from src._panel import (
+    bin_days,
+    bin_of,
+    complete_panel,
+    merge_daily,
+    merge_incremental,
+    panel_name,
+    read_state,
+    to_wide,
+    watermark_date,
+    write_state,
+    write_wide,
+)
+from src._strava import (
+    EDGE_DAILY,
+    STRAVA_DB,
+    daily_hex_counts,
+    edge_centroids,
+    export_edge_daily,
+    hex_counts_from_edges,
+    hourly_source,
+    sync_parquet,
+    weekly_hex_counts,
+)
 
 
 # -- PARAMETERS --
 TREATMENT_DATE = "2022-11-21"
+START_DATE = "2021-11-21"
+END_DATE = "2024-11-21"  # None = all available data
+PARTITIONED = False  # read a date-partitioned parquet copy of the raw data, kept in sync
+INCREMENTAL = False  # only aggregate and complete the days (weeks without DAILY) from the stored watermark onward
+DAILY = True  # aggregate once to hex x day (DAILY_PATH) and bin every resolution from it
+FROM_CACHE = False  # skip duckdb and bin the existing DAILY_PATH, e.g. to add a resolution
+RESOLUTIONS = ["week"]  # "day", "week", "month" or a bin width in days, e.g. 14
+SWEEP_RADII = []  # sweep grids from 1_hexagons.py to build panels for too, e.g. [250, 1000]
+
+PANEL_PATH = "data/panel_weekly.parquet"
+STATE_PATH = "data/panel_weekly_state.json"
+WIDE_PATH = "data/panel_weekly_wide"
+HEX_EDGE_MAP_PATH = "data/hex_edge_map.parquet"
+DAILY_PATH = "data/hex_daily.parquet"
 
 
 # -- LOAD DATA --
-conn = duckdb.connect("data/strava/strava.duckdb")
 hex_gdf = gpd.read_parquet("data/berlin_hexagons.parquet")
 osm_features = pd.read_csv("data/hex_osm_features.csv")
-
-hex_gdf = hex_gdf.to_crs("EPSG:3857")
-
-# IMPORTANT: filter edge counts by date range here to speed up query
-edge_counts = conn.execute("""
-    SELECT
-        edge_uid,
-        DATE_TRUNC('day', STRPTIME(hour, '%Y-%m-%dT%H')) as date,
-        SUM(total_trip_count) as daily_count
-    FROM data
-    WHERE STRPTIME(hour, '%Y-%m-%dT%H') >= '2021-11-21'
-      AND STRPTIME(hour, '%Y-%m-%dT%H') < '2024-11-21'
-    GROUP BY edge_uid, date
-""").df()
-conn.close()
-
-
-# -- HEX-EDGE MAPPING --
-gdf = gpd.read_file("data/strava/strava_map.shp")
-if gdf.crs is None:
-    gdf = gdf.set_crs("EPSG:4326")
-gdf = gdf.to_crs("EPSG:3857")
-gdf["centroid"] = gdf.geometry.centroid
-
-centroids_gdf = gpd.GeoDataFrame(gdf[["edgeUID"]], geometry=gdf["centroid"], crs=gdf.crs)
-hex_joined = gpd.sjoin(hex_gdf, centroids_gdf, how="left", predicate="contains")
-hex_edge_map = hex_joined[["edgeUID"]].reset_index()
-hex_edge_map.columns = ["hex_id", "edge_uid"]
-
-
-# -- BUILD DAILY PANEL --
-hex_time = edge_counts.merge(hex_edge_map, on="edge_uid", how="inner")
-daily = hex_time.groupby(["hex_id", "date"])["daily_count"].sum().reset_index()
-daily["date"] = pd.to_datetime(daily["date"])
-daily = daily.rename(columns={"daily_count": "trips"})
-
-
-# -- AGGREGATE TO WEEKS (centered on treatment) --
-treatment_dt = pd.Timestamp(TREATMENT_DATE)
-daily["days_from_treatment"] = (daily["date"] - treatment_dt).dt.days
-daily["time"] = daily["days_from_treatment"] // 7
-
-panel = (
-    daily.groupby(["hex_id", "time"])
-    .agg(
-        trips=("trips", "sum"),
+hex_info = hex_gdf[["hex_id", "unit_type"]]
+
+if SWEEP_RADII and (INCREMENTAL or not DAILY):
+    raise ValueError("SWEEP_RADII needs DAILY = True and INCREMENTAL = False")
+caches = [DAILY_PATH, EDGE_DAILY] if SWEEP_RADII else [DAILY_PATH]
+if FROM_CACHE and not (DAILY and all(Path(path).exists() for path in caches)):
+    raise FileNotFoundError(
+        f"FROM_CACHE needs DAILY = True and {', '.join(caches)}; "
+        "run once with FROM_CACHE = False"
     )
-    .reset_index()
-)
-
-
-# -- COMPLETE PANEL --
-all_hexes = panel["hex_id"].unique()
-all_times = range(panel["time"].min(), panel["time"].max() + 1)
-
-full_index = pd.MultiIndex.from_product([all_hexes, all_times], names=["hex_id", "time"])
-panel = (
-    panel.set_index(["hex_id", "time"]).reindex(full_index, fill_value=0).reset_index()
-)
-
-
-# -- MERGE UNIT TYPE FROM HEXAGONS --
-hex_info = gpd.read_parquet("data/berlin_hexagons.parquet")[["hex_id", "unit_type"]]
-panel = panel.merge(hex_info, on="hex_id", how="left")
-
 
-# -- SAVE PANEL --
-panel.to_parquet("data/panel_weekly.parquet", index=False)
+if DAILY:
+    # the daily cache is not centered on treatment, so only its last day matters
+    incremental = INCREMENTAL and Path(DAILY_PATH).exists() and Path(HEX_EDGE_MAP_PATH).exists()
+else:
+    state = read_state(STATE_PATH) if INCREMENTAL else None
+    if state is not None and state["treatment_date"] != TREATMENT_DATE:
+        raise ValueError(
+            f"{STATE_PATH} was built for treatment date {state['treatment_date']}, "
+            f"not {TREATMENT_DATE}; rebuild with INCREMENTAL = False"
+        )
+    incremental = state is not None and Path(HEX_EDGE_MAP_PATH).exists()
+
+
+if not FROM_CACHE:
+    # -- HEX-EDGE MAPPING --
+    if incremental:
+        hex_edge_map = pd.read_parquet(HEX_EDGE_MAP_PATH)
+    else:
+        edge_uid, edge_x, edge_y = edge_centroids()
+
+        # the grid is regular, so each centroid's hex is found in closed form
+        grid_params = load_grid_params("data/berlin_hexagons.json")
+        hex_index = HexIndex.from_hexagons(hex_gdf, **grid_params)
+
+        hex_edge_map = pd.DataFrame(
+            {"hex_id": hex_index.lookup(edge_x, edge_y), "edge_uid": edge_uid}
+        )
+        hex_edge_map = hex_edge_map[hex_edge_map["hex_id"] >= 0]
+        with section("hex_edge_map", outputs=[HEX_EDGE_MAP_PATH], rows=len(hex_edge_map)):
+            hex_edge_map.to_parquet(HEX_EDGE_MAP_PATH, index=False)
+
+    # -- AGGREGATE TO HEX-DAYS (OR HEX-WEEKS) IN DUCKDB --
+    conn = duckdb.connect(STRAVA_DB)
+    if PARTITIONED:
+        with section("sync_parquet") as s:
+            s["action"] = sync_parquet(conn)
+    source = hourly_source(conn, PARTITIONED)
+
+    # only the aggregated result leaves duckdb; date filters prune parquet partitions
+    conn.register("hex_edge_map", hex_edge_map)
+    if DAILY and SWEEP_RADII:
+        # one scan of the hourly data to edge x day, shared by this grid and the sweep
+        with section("duckdb_edge_daily", outputs=[EDGE_DAILY]):
+            export_edge_daily(conn, source, START_DATE, END_DATE)
+        with section("duckdb_hex_daily", outputs=[DAILY_PATH]) as s:
+            daily = hex_counts_from_edges(conn)
+            daily.to_parquet(DAILY_PATH, index=False)
+            s["rows"] = len(daily)
+    elif DAILY:
+        # incremental runs start at the last cached day, which may have been partial
+        daily = pd.read_parquet(DAILY_PATH) if incremental else None
+        start_date = daily["date"].max().strftime("%Y-%m-%d") if incremental else START_DATE
+        with section("duckdb_hex_daily", outputs=[DAILY_PATH], start_date=start_date) as s:
+            new_days = daily_hex_counts(conn, source, start_date, END_DATE)
+            daily = merge_daily(daily, new_days) if incremental else new_days
+            daily.to_parquet(DAILY_PATH, index=False)
+            s["rows"] = len(new_days)
+    else:
+        # incremental runs start at the watermark week, which may have been partial
+        watermark = state["last_week"] if incremental else None
+        start_date = watermark_date(TREATMENT_DATE, watermark) if incremental else START_DATE
+        with section("duckdb_hex_weekly", start_date=start_date) as s:
+            counts = weekly_hex_counts(conn, source, TREATMENT_DATE, start_date, END_DATE)
+            s["rows"] = len(counts)
+        counts = counts.sort_values(["hex_id", "time"], ignore_index=True)
+    conn.close()
+
+
+# -- BIN, COMPLETE AND SAVE PANELS (centered on treatment) --
+def save_panels(daily, hex_info, out_dir="data", suffix="", since=None):
+    """Bin hex x day counts to each of RESOLUTIONS and save every panel with its wide matrix.
+
+    With since (the first re-aggregated day), existing panels keep their bins before the
+    one containing it, and only the later bins are binned and completed (merge_incremental).
+    """
+    for resolution in RESOLUTIONS:
+        name = panel_name(resolution) + suffix
+        outputs = [f"{out_dir}/{name}.parquet", f"{out_dir}/{name}_wide"]
+        if since is not None and Path(outputs[0]).exists():
+            watermark = bin_of([since], TREATMENT_DATE, resolution)[0]
+            new_days = daily[bin_of(daily["date"], TREATMENT_DATE, resolution) >= watermark]
+            counts = bin_days(new_days, TREATMENT_DATE, resolution, START_DATE, END_DATE)
+            panel = merge_incremental(pd.read_parquet(outputs[0]), counts, watermark, hex_info)
+        else:
+            counts = bin_days(daily, TREATMENT_DATE, resolution, START_DATE, END_DATE)
+            all_hexes = counts["hex_id"].unique()
+            all_times = range(counts["time"].min(), counts["time"].max() + 1)
+            panel = complete_panel(counts, all_hexes, all_times, hex_info)
+
+        with section(f"save_{name}", outputs=outputs, rows=len(panel)):
+            panel.to_parquet(outputs[0], index=False)
+            write_wide(to_wide(panel), outputs[1])
+
+
+if DAILY:
+    if FROM_CACHE:
+        daily = pd.read_parquet(DAILY_PATH)
+
+    save_panels(daily, hex_info, since=start_date if incremental and not FROM_CACHE else None)
+    if "week" in RESOLUTIONS:
+        last_week = pd.read_parquet(PANEL_PATH, columns=["time"])["time"].max()
+        write_state(STATE_PATH, TREATMENT_DATE, last_week)
+else:
+    if incremental:
+        panel = merge_incremental(
+            pd.read_parquet(PANEL_PATH), counts, watermark, hex_info
+        )
+    else:
+        all_hexes = counts["hex_id"].unique()
+        all_times = range(counts["time"].min(), counts["time"].max() + 1)
+        panel = complete_panel(counts, all_hexes, all_times, hex_info)
+
+    with section("save_panel_weekly", outputs=[PANEL_PATH, WIDE_PATH], rows=len(panel)):
+        panel.to_parquet(PANEL_PATH, index=False)
+        write_wide(to_wide(panel), WIDE_PATH)
+    write_state(STATE_PATH, TREATMENT_DATE, panel["time"].max())
+
+
+# -- RADIUS SWEEP (every grid aggregated from one read of the edge-day counts) --
+if SWEEP_RADII:
+    if FROM_CACHE:
+        edge_uid, edge_x, edge_y = edge_centroids()
+
+    # edge -> hex for every radius, stacked into one (radius, edge_uid, hex_id) map
+    grids, maps = {}, []
+    for radius in SWEEP_RADII:
+        hexagons_path, params_path = sweep_paths(radius)
+        if not hexagons_path.exists():
+            raise FileNotFoundError(
+                f"{hexagons_path} not found; run src/1_hexagons.py with SWEEP_RADII"
+            )
+        grids[radius] = gpd.read_parquet(hexagons_path)
+        index = HexIndex.from_hexagons(grids[radius], **load_grid_params(params_path))
+        hex_ids = index.lookup(edge_x, edge_y)
+        inside = hex_ids >= 0
+        maps.append(
+            pd.DataFrame(
+                {"radius": radius, "edge_uid": edge_uid[inside], "hex_id": hex_ids[inside]}
+            )
+        )
+
+    conn = duckdb.connect()
+    conn.register("edge_hex_map", pd.concat(maps, ignore_index=True))
+    with section("duckdb_sweep_hex_daily", radii=list(SWEEP_RADII)) as s:
+        sweep_daily = hex_counts_from_edges(conn, "edge_hex_map")
+        s["rows"] = len(sweep_daily)
+    conn.close()
+
+    for radius, daily in sweep_daily.groupby("radius"):
+        hex_info = grids[radius][["hex_id", "unit_type"]]
+        save_panels(daily, hex_info, SWEEP_DIR, suffix=f"_{radius:g}m")
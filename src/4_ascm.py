@@ -0,0 +1,128 @@
+"""
+runs SCM and ridge ASCM natively in python (same estimators as augsynth in 4_ascm.R),
+with conformal or jackknife+ inference for the per-week att (INFERENCE)
+outputs: models/results/{timeseries,att,weights,summary}/model={scm,ascm}/run_id=<RUN_ID>/,
+         models/results/placebo_{trajectories,summary}/model=ascm/run_id=<RUN_ID>/,
+         models/results/_runs.json (completed runs)
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src._ascm import fit_ascm
+from src._inference import att_inference
+from src._instrument import section
+from src._panel import load_wide
+from src._placebo import placebo_outputs, run_placebos
+from src._results import complete_run, model_tables, new_run_id, write_tables
+
+
+# -- PARAMETERS --
+TREATMENT_TIME = 0
+TEST = True  # set to True for fast testing (10 donors, 2 placebos)
+N_PLACEBO = 50  # None = every donor
+SEED = 42
+TARGET_PRE = -52
+TARGET_POST = 104
+MAX_WORKERS = None  # None = one per cpu
+BATCHED = True  # fit placebos in chunks on a shared gram matrix (False = one fit each)
+INFERENCE = "conformal"  # "conformal", "jackknife+" or None (no std_error or bands, as in R)
+ALPHA = 0.05  # 1 - coverage of the att bands
+CHECKPOINT_DIR = "models/placebo_checkpoints"
+RIDGE_CACHE_DIR = "models/ridge_cache"  # svd of each donor set, reused on reruns (None = off)
+RUN_ID = None  # results store partition (None = the start time of the run)
+KEEP_RUNS = 5  # completed runs kept in the results store, older ones are deleted (None = all)
+WIDE_PATH = "data/panel_weekly_wide"  # or another resolution from 3_panel.py (TARGET_* in its units)
+
+
+def main():
+    # -- SETUP AND DATA LOADING --
+    # memory-mapped units x weeks matrix written by 3_panel.py; rows are grouped by
+    # unit type, so the treated/donor rows and the analysis window are plain views
+    panel = load_wide(WIDE_PATH)
+    weeks = panel.weeks(TARGET_PRE, TARGET_POST)
+    treated_hex = panel.hex_id[panel.rows("treated")][0]
+    donor_ids = panel.hex_id[panel.rows("donor")]
+    donors = panel.trips[panel.rows("donor"), weeks]
+
+    # TEST MODE: Limit to 10 donors for fast testing
+    rng = np.random.default_rng(SEED)
+    if TEST:
+        sample = np.sort(rng.choice(len(donor_ids), size=min(10, len(donor_ids)), replace=False))
+        donor_ids, donors = donor_ids[sample], donors[sample]
+
+    # units x weeks outcome matrix (donors, then treated), shared by the main fits
+    # and every placebo
+    units = np.append(donor_ids, treated_hex)
+    Y = np.vstack([donors, panel.trips[panel.rows("treated"), weeks]]).astype(float)
+
+    times = panel.time[weeks]
+    Y0 = Y[:-1]
+    y1 = Y[-1]
+    pre = times < TREATMENT_TIME
+
+    n_donors = len(donor_ids)
+
+    # -- EXPORT RESULTS FOR PLOTTING AND REPORTING --
+    output_dir = Path("models")
+    output_dir.mkdir(exist_ok=True)
+    run_id = RUN_ID or new_run_id()
+
+    fits = {}
+    for model_name, progfunc in [("scm", "none"), ("ascm", "ridge")]:
+        with section(f"fit_{model_name}", donors=n_donors, periods=len(times)):
+            fit = fits[model_name] = fit_ascm(
+                Y0, y1, pre, progfunc=progfunc, cache_dir=RIDGE_CACHE_DIR
+            )
+
+        # std_error and per-week bands; the refits run in parallel across cores
+        inference = None
+        if INFERENCE is not None:
+            with section(f"inference_{model_name}", method=INFERENCE):
+                inference = att_inference(
+                    Y0, y1, pre, fit, INFERENCE, ALPHA, max_workers=MAX_WORKERS
+                )
+
+        write_tables(
+            model_tables(fit, times, y1, donor_ids, treated_hex, pre, inference),
+            output_dir,
+            model_name,
+            run_id,
+        )
+
+    # -- PLACEBO INFERENCE --
+    # each placebo donor is refit against all other units (incl. the treated hex)
+    n_placebo = 2 if TEST else N_PLACEBO
+    if n_placebo is None or n_placebo >= n_donors:
+        placebo_units = donor_ids
+    else:
+        placebo_units = rng.choice(donor_ids, size=n_placebo, replace=False)
+
+    # every fit is also recorded on its own, with the worker's wall time and peak rss
+    with section("placebos", placebos=len(placebo_units), batched=BATCHED):
+        placebo_gaps = run_placebos(
+            Y,
+            units,
+            placebo_units,
+            pre,
+            checkpoint_dir=CHECKPOINT_DIR,
+            max_workers=MAX_WORKERS,
+            batched=BATCHED,
+            cache_dir=RIDGE_CACHE_DIR,
+        )
+
+    trajectories, summary = placebo_outputs(
+        placebo_gaps, treated_hex, fits["ascm"].att, times, pre
+    )
+    write_tables(
+        {"placebo_trajectories": trajectories, "placebo_summary": summary},
+        output_dir,
+        "ascm",
+        run_id,
+    )
+    # readers switch to this run only now that all its tables are written
+    complete_run(output_dir, run_id, ["scm", "ascm"], keep=KEEP_RUNS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+runs SCM and ridge ASCM for every intervention in data/interventions.csv: each has its
+own treated hexes, treatment date and donor pool, and all are fit in parallel on one
+memory-mapped weekly panel
+outputs: models/batch/<intervention>/results/ (the results store of 4_ascm.py, with the
+         placebo tables if N_PLACEBO), models/batch/summary.csv (the summary tables of
+         this run for all interventions, replaced by every run; the stores keep the runs)
+"""
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from src._ascm import fit_ascm, fit_placebos
+from src._design import design_masks, read_interventions
+from src._panel import load_wide
+from src._placebo import placebo_outputs
+from src._results import complete_run, model_tables, new_run_id, write_tables
+
+
+# -- PARAMETERS --
+INTERVENTIONS_PATH = "data/interventions.csv"
+PANEL_TREATMENT_DATE = "2022-11-21"  # week 0 of the panel (TREATMENT_DATE in 3_panel.py)
+TEST = True  # set to True for fast testing (10 donors per intervention)
+N_PLACEBO = 0  # placebos per intervention (0 = none, None = every donor)
+SEED = 42
+TARGET_PRE = -52  # weeks relative to each intervention's treatment week
+TARGET_POST = 104
+EXCLUDE_OTHER_TREATED = True  # keep every intervention's treated hexes out of all donor pools
+MAX_WORKERS = None  # None = one per cpu
+WIDE_PATH = "data/panel_weekly_wide"
+HEXAGONS_PATH = "data/berlin_hexagons.parquet"
+OUTPUT_DIR = "models/batch"
+RUN_ID = None  # results store partition (None = the start time of the run)
+KEEP_RUNS = 5  # completed runs kept in each results store (None = all)
+RIDGE_CACHE_DIR = "models/ridge_cache"  # svd of each donor set, shared with 4_ascm.py (None = off)
+
+
+# -- WORKERS --
+_PANEL = None
+_RUN_ID = None
+
+
+def _init_worker(wide_path, run_id):
+    # every worker maps the same file, so the panel is paged in once for all of them
+    global _PANEL, _RUN_ID
+    _PANEL = load_wide(wide_path)
+    _RUN_ID = run_id
+
+
+def _fit_study(study):
+    """Fit scm and ascm for one intervention, write its outputs, return its summary rows."""
+    weeks = _PANEL.weeks(study["week"] + TARGET_PRE, study["week"] + TARGET_POST)
+    times = _PANEL.time[weeks] - study["week"]
+    pre = times < 0
+
+    # several treated hexes are averaged into one treated unit
+    y1 = _PANEL.trips[study["treated_rows"], weeks].mean(axis=0).astype(float)
+    donor_ids = _PANEL.hex_id[study["donor_rows"]]
+    Y0 = _PANEL.trips[study["donor_rows"], weeks].astype(float)
+
+    rng = np.random.default_rng(SEED)
+    if TEST:
+        sample = np.sort(rng.choice(len(donor_ids), size=min(10, len(donor_ids)), replace=False))
+        donor_ids, Y0 = donor_ids[sample], Y0[sample]
+
+    output_dir = Path(OUTPUT_DIR) / study["intervention"]
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    summaries, fits = [], {}
+    for model_name, progfunc in [("scm", "none"), ("ascm", "ridge")]:
+        fit = fits[model_name] = fit_ascm(
+            Y0, y1, pre, progfunc=progfunc, cache_dir=RIDGE_CACHE_DIR
+        )
+        tables = model_tables(fit, times, y1, donor_ids, study["treated_hex"], pre)
+        write_tables(tables, output_dir, model_name, _RUN_ID)
+        summaries.append(
+            tables["summary"].assign(intervention=study["intervention"], model=model_name)
+        )
+
+    # -- PLACEBO INFERENCE --
+    n_placebo = N_PLACEBO if N_PLACEBO is not None else len(donor_ids)
+    if n_placebo > 0:
+        rows = np.arange(len(donor_ids))
+        if n_placebo < len(donor_ids):
+            rows = rng.choice(rows, size=n_placebo, replace=False)
+        gaps = fit_placebos(np.vstack([Y0, y1]), rows, pre, cache_dir=RIDGE_CACHE_DIR)
+        trajectories, summary = placebo_outputs(
+            dict(zip(donor_ids[rows], gaps)), study["treated_hex"], fits["ascm"].att, times, pre
+        )
+        write_tables(
+            {"placebo_trajectories": trajectories, "placebo_summary": summary},
+            output_dir,
+            "ascm",
+            _RUN_ID,
+        )
+    complete_run(output_dir, _RUN_ID, ["scm", "ascm"], keep=KEEP_RUNS)
+
+    return pd.concat(summaries, ignore_index=True)
+
+
+def main():
+    # -- DESIGNS --
+    interventions = read_interventions(INTERVENTIONS_PATH)
+    hexagons = gpd.read_parquet(HEXAGONS_PATH)
+    treated, donors = design_masks(interventions, hexagons, EXCLUDE_OTHER_TREATED)
+
+    # grid hex -> panel row (-1 for hexes without any trips, which are not in the panel)
+    panel = load_wide(WIDE_PATH)
+    order = np.argsort(panel.hex_id)
+    hex_ids = hexagons["hex_id"].values
+    rows = order[np.searchsorted(panel.hex_id, hex_ids, sorter=order).clip(max=len(order) - 1)]
+    rows[panel.hex_id[rows] != hex_ids] = -1
+
+    # treatment dates snap to the panel's week grid
+    weeks = (interventions["treatment_date"] - pd.Timestamp(PANEL_TREATMENT_DATE)).dt.days // 7
+
+    studies, problems = [], []
+    for k, intervention in enumerate(interventions["intervention"]):
+        treated_rows = rows[treated[k] & (rows >= 0)]
+        donor_rows = np.sort(rows[donors[k] & (rows >= 0)])
+        window = panel.time[panel.weeks(weeks[k] + TARGET_PRE, weeks[k] + TARGET_POST)]
+        if len(treated_rows) == 0:
+            problems.append(f"{intervention}: treated hexes have no trips in the panel")
+        elif not ((window < weeks[k]).sum() >= 2 and (window >= weeks[k]).any()):
+            problems.append(f"{intervention}: treatment date leaves no pre/post window")
+        else:
+            studies.append(
+                {
+                    "intervention": intervention,
+                    "week": int(weeks[k]),
+                    "treated_rows": treated_rows,
+                    "donor_rows": donor_rows,
+                    "treated_hex": ";".join(map(str, np.sort(hex_ids[treated[k]]))),
+                }
+            )
+    if problems:
+        raise ValueError("\n".join(problems))
+
+    # -- FIT ALL STUDIES --
+    run_id = RUN_ID or new_run_id()
+    with ProcessPoolExecutor(
+        max_workers=MAX_WORKERS,
+        initializer=_init_worker,
+        initargs=(WIDE_PATH, run_id),
+    ) as executor:
+        summaries = []
+        for study, summary in zip(studies, executor.map(_fit_study, studies)):
+            print(f"  {study['intervention']}: {len(study['donor_rows'])} donors")
+            summaries.append(summary)
+
+    # one table across interventions for a quick comparison; written only after every
+    # study completed, so it never mixes runs
+    columns = ["intervention", "model", "run_id"]
+    summary = pd.concat(summaries, ignore_index=True).assign(run_id=run_id)
+    summary = summary[columns + [c for c in summary.columns if c not in columns]]
+    path = Path(OUTPUT_DIR) / "summary.csv"
+    summary.to_csv(path.with_suffix(".tmp"), index=False)
+    path.with_suffix(".tmp").replace(path)
+
+
+if __name__ == "__main__":
+    main()
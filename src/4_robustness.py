@@ -0,0 +1,191 @@
+"""
+robustness runs for the scm and ascm fits of 4_ascm.py: in-time placebos (a fake treatment
+week in the pre-period, fit on pre-period data only) and leave-one-donor-out refits for
+every donor with an scm weight > 0, fit in a process pool from one units x weeks matrix;
+each design is written as a parquet part when it finishes, and a rerun skips finished parts
+outputs: models/robustness.parquet, models/robustness_parts/<fingerprint>/*.parquet
+         (fingerprint: data, design parameters, fit code and estimator version)
+"""
+
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from src._ascm import fit_ascm
+from src._fingerprint import fingerprint
+from src._instrument import peak_rss_mb, record
+from src._panel import load_wide
+
+
+# -- PARAMETERS --
+TREATMENT_TIME = 0
+TEST = True  # set to True for fast testing (10 donors, as in 4_ascm.py)
+SEED = 42
+TARGET_PRE = -52
+TARGET_POST = 104
+IN_TIME = [-26, -13]  # fake treatment weeks of the in-time placebos
+LEAVE_ONE_OUT = True  # refit without each donor with an scm weight > 0
+MIN_WEIGHT = 1e-6  # scm weights below this count as zero
+MAX_WORKERS = None  # None = one per cpu
+WIDE_PATH = "data/panel_weekly_wide"
+OUTPUT_PATH = "models/robustness.parquet"
+PARTS_DIR = "models/robustness_parts"  # finished designs; read the folder to monitor a sweep
+RIDGE_CACHE_DIR = "models/ridge_cache"  # svd of each donor set, shared with 4_ascm.py
+
+MODELS = [("scm", "none"), ("ascm", "ridge")]
+
+
+# -- WORKERS --
+_Y = None
+_TIMES = None
+
+
+def _init_worker(Y, times):
+    global _Y, _TIMES
+    _Y, _TIMES = Y, times
+
+
+def _fit_design(design):
+    """Fit scm and ascm for one design; returns its tidy rows, wall time and peak rss.
+
+    Rows of _Y are the donors, then the treated unit. In-time placebos only see the
+    weeks before TREATMENT_TIME; leave-one-out designs drop one donor row.
+    """
+    start = time.perf_counter()
+    weeks = _TIMES < TREATMENT_TIME if design["design"] == "in_time" else slice(None)
+    donors = np.delete(np.arange(len(_Y) - 1), design.get("dropped_row", []))
+    Y0 = _Y[donors][:, weeks]
+    y1 = _Y[-1, weeks]
+    times = _TIMES[weeks]
+    pre = times < design["treatment_time"]
+
+    frames = []
+    for model_name, progfunc in MODELS:
+        fit = fit_ascm(Y0, y1, pre, progfunc=progfunc, cache_dir=RIDGE_CACHE_DIR)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "model": model_name,
+                    "time": times,
+                    "observed": y1,
+                    "synthetic": fit.synthetic,
+                    "att": fit.att,
+                }
+            )
+        )
+    rows = pd.concat(frames, ignore_index=True).assign(
+        design=design["design"],
+        treatment_time=np.int16(design["treatment_time"]),
+        dropped_hex=design.get("dropped_hex"),
+    )
+    rows = rows.astype({"dropped_hex": "Int32"})
+    return rows, time.perf_counter() - start, peak_rss_mb()
+
+
+# -- DESIGNS --
+def make_designs(Y, units, times):
+    """The main fit, one in-time placebo per IN_TIME week and one leave-one-out per donor."""
+    designs = [{"design": "main", "name": "main", "treatment_time": TREATMENT_TIME}]
+    pre_weeks = times[times < TREATMENT_TIME]
+    for fake in IN_TIME:
+        # at least two weeks before and one after the fake treatment
+        if (pre_weeks < fake).sum() >= 2 and (pre_weeks >= fake).any():
+            designs.append(
+                {"design": "in_time", "name": f"in_time_{fake}", "treatment_time": fake}
+            )
+        else:
+            print(f"  skipping in-time placebo at {fake}: no pre/post window")
+
+    if LEAVE_ONE_OUT:
+        weights = fit_ascm(Y[:-1], Y[-1], times < TREATMENT_TIME, progfunc="none").weights
+        for row in np.flatnonzero(weights > MIN_WEIGHT):
+            designs.append(
+                {
+                    "design": "leave_one_out",
+                    "name": f"leave_one_out_{units[row]}",
+                    "treatment_time": TREATMENT_TIME,
+                    "dropped_row": row,
+                    "dropped_hex": int(units[row]),
+                }
+            )
+    return designs
+
+
+def _save(path, rows):
+    # hidden temporary name: readers of the folder skip it until the rename
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp")
+    rows.to_parquet(tmp, index=False)
+    tmp.replace(path)
+
+
+def main():
+    # -- SETUP AND DATA LOADING --
+    # same donors and window as 4_ascm.py
+    panel = load_wide(WIDE_PATH)
+    weeks = panel.weeks(TARGET_PRE, TARGET_POST)
+    treated_hex = panel.hex_id[panel.rows("treated")][0]
+    donor_ids = panel.hex_id[panel.rows("donor")]
+    donors = panel.trips[panel.rows("donor"), weeks]
+
+    rng = np.random.default_rng(SEED)
+    if TEST:
+        sample = np.sort(rng.choice(len(donor_ids), size=min(10, len(donor_ids)), replace=False))
+        donor_ids, donors = donor_ids[sample], donors[sample]
+
+    units = np.append(donor_ids, treated_hex)
+    Y = np.vstack([donors, panel.trips[panel.rows("treated"), weeks]]).astype(float)
+    times = panel.time[weeks]
+
+    designs = make_designs(Y, units, times)
+
+    # -- RESUME --
+    # parts are only reused by runs that would fit them the same way
+    key = fingerprint(
+        Y,
+        times,
+        units,
+        treatment_time=TREATMENT_TIME,
+        min_weight=MIN_WEIGHT,
+        models=MODELS,
+        fit_code=inspect.getsource(_fit_design),
+    )
+    parts = Path(PARTS_DIR) / key
+    parts.mkdir(parents=True, exist_ok=True)
+    todo = [d for d in designs if not (parts / f"{d['name']}.parquet").exists()]
+    print(f"  robustness: {len(designs) - len(todo)} of {len(designs)} designs done, {parts}")
+
+    # -- FIT --
+    if todo:
+        with ProcessPoolExecutor(
+            max_workers=MAX_WORKERS, initializer=_init_worker, initargs=(Y, times)
+        ) as executor:
+            futures = {executor.submit(_fit_design, d): d for d in todo}
+            for done, future in enumerate(as_completed(futures), start=1):
+                design = futures[future]
+                rows, seconds, rss = future.result()
+                _save(parts / f"{design['name']}.parquet", rows)
+                record(
+                    "robustness_fit",
+                    design=design["name"],
+                    wall_s=round(seconds, 4),
+                    worker_peak_rss_mb=rss,
+                )
+                print(f"  {done}/{len(todo)} {design['name']} ({seconds:.1f}s)")
+
+    # -- COMBINE --
+    results = pd.concat(
+        [pd.read_parquet(parts / f"{d['name']}.parquet") for d in designs], ignore_index=True
+    )
+    results = results[
+        ["design", "model", "treatment_time", "dropped_hex", "time", "observed", "synthetic", "att"]
+    ]
+    Path(OUTPUT_PATH).parent.mkdir(parents=True, exist_ok=True)
+    results.to_parquet(OUTPUT_PATH, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,11 @@ plot scm and ascm results
 outputs: output/figs/scm_combined.png, acsm_combined.png
 """
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 from pathlib import Path
 from src._plot_style import PlotStyle
+from src._results import read_table
 from scipy.interpolate import make_interp_spline
 import numpy as np
 from datetime import datetime, timedelta
@@ -24,15 +24,16 @@ input_dir = Path("models")
 output_dir = Path("output/figs")
 
 
-style = PlotStyle()
-style.apply()
-
-
-# -- PLOT BOTH MODELS --
-for model_name in ["scm", "ascm"]:
+# -- PLOT --
+def plot_results(model_name, style):
+    """Observed vs synthetic (A) and gap (B) panels for one model."""
     # Load data
-    timeseries = pd.read_csv(input_dir / f"{model_name}_timeseries.csv")
-    att = pd.read_csv(input_dir / f"{model_name}_att.csv")
+    timeseries = read_table(
+        input_dir, "timeseries", model_name, columns=["time", "observed", "synthetic"]
+    )
+    att = read_table(
+        input_dir, "att", model_name, columns=["time", "att", "lower_bound", "upper_bound"]
+    )
 
     # Create figure with GridSpec (2 columns for 2 plots)
     fig = plt.figure(figsize=(12, 4))
@@ -102,6 +103,18 @@ for model_name in ["scm", "ascm"]:
         linewidth=1.2,
         alpha=0.8,
     )
+
+    # Shade the confidence band (written by 4_ascm.py with INFERENCE; absent from R outputs)
+    if "lower_bound" in att:
+        band = att[np.isfinite(att["lower_bound"]) & np.isfinite(att["upper_bound"])]
+        ax2.fill_between(
+            band["time"],
+            band["lower_bound"],
+            band["upper_bound"],
+            color=style.colors["teal"],
+            alpha=0.15,
+            linewidth=0,
+        )
     ax2.axhline(
         y=0,
         color=style.colors["text"],
@@ -172,6 +185,15 @@ for model_name in ["scm", "ascm"]:
         output_dir.mkdir(parents=True, exist_ok=True)
         output_path = output_dir / f"{model_name}_combined.png"
         plt.savefig(output_path, dpi=300, bbox_inches="tight")
-        plt.close()
+        plt.close(fig)
     else:
         plt.show()
+
+
+if __name__ == "__main__":
+    style = PlotStyle()
+    style.apply()
+
+    # -- PLOT BOTH MODELS --
+    for model_name in ["scm", "ascm"]:
+        plot_results(model_name, style)
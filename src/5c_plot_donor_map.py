@@ -9,6 +9,8 @@ import matplotlib.pyplot as plt
 import contextily as ctx
 from pathlib import Path
 from src._plot_style import PlotStyle
+from src._results import read_table
+from src._tiles import TileCache
 import warnings
 
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -16,28 +18,56 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 # -- PARAMETERS --
 SAVE = True
+BASEMAP_ZOOM = 12
+TILE_CACHE_DIR = "data/tile_cache"  # persistent tile cache, reused across runs
+TILE_CACHE_MB = 200  # least recently used tiles are evicted above this size
+MBTILES_PATH = None  # optional local .mbtiles file checked before the cache
+OFFLINE = False  # never touch the network: tiles must come from the cache or mbtiles
 
 
 # -- SETUP --
 output_dir = Path("output/figs")
 input_dir = Path("models")
 
-# Load base hexagons
-hexagons = gpd.read_parquet("data/berlin_hexagons.parquet")
-hexagons = hexagons.to_crs("EPSG:3857")
+tiles = TileCache(
+    ctx.providers.CartoDB.Positron,
+    cache_dir=TILE_CACHE_DIR,
+    max_mb=TILE_CACHE_MB,
+    mbtiles=MBTILES_PATH,
+    offline=OFFLINE,
+)
 
-treated = hexagons[hexagons["unit_type"] == "treated"]
-excluded = hexagons[hexagons["unit_type"] == "excluded"]
-donors = hexagons[hexagons["unit_type"] == "donor"]
 
-style = PlotStyle()
-style.apply()
+def load_units():
+    """Treated, excluded and donor hexagons in web mercator."""
+    hexagons = gpd.read_parquet("data/berlin_hexagons.parquet")
+    hexagons = hexagons.to_crs("EPSG:3857")
 
+    treated = hexagons[hexagons["unit_type"] == "treated"]
+    excluded = hexagons[hexagons["unit_type"] == "excluded"]
+    donors = hexagons[hexagons["unit_type"] == "donor"]
+    return treated, excluded, donors
+
+
+def map_extent(treated, donors, buffer=1000):
+    """Bounds of donors + treated plus a buffer (tighter cropping than the full grid)."""
+    minx, miny, maxx, maxy = pd.concat([donors, treated]).total_bounds
+    return minx - buffer, miny - buffer, maxx + buffer, maxy + buffer
+
+
+def prefetch_basemap(units):
+    """Stitch the basemap once, so both model maps (and forked workers) reuse it."""
+    treated, _, donors = units
+    tiles.image(map_extent(treated, donors), BASEMAP_ZOOM)
+
+
+# -- PLOT --
+def plot_donor_map(model_name, style, units=None):
+    """Study design map: treated hexagon, donors shaded by weight, excluded units."""
+    treated, excluded, donors = load_units() if units is None else units
 
-# -- PLOT BOTH MODELS --
-for model_name in ["scm", "ascm"]:
     # Load weights
-    weights = pd.read_csv(input_dir / f"{model_name}_weights.csv")
+    weights = read_table(input_dir, "weights", model_name, columns=["hex_id", "weight"])
 
     # Merge with donors and split by weight
     donors_merged = donors.merge(weights[["hex_id", "weight"]], on="hex_id", how="left")
@@ -128,14 +158,12 @@ for model_name in ["scm", "ascm"]:
     )
 
     # Crop the map to bounds of donors + treated (tighter cropping)
-    all_units = pd.concat([donors, treated])
-    minx, miny, maxx, maxy = all_units.total_bounds
-    buffer = 1000
-    ax.set_xlim(minx - buffer, maxx + buffer)
-    ax.set_ylim(miny - buffer, maxy + buffer)
+    minx, miny, maxx, maxy = map_extent(treated, donors)
+    ax.set_xlim(minx, maxx)
+    ax.set_ylim(miny, maxy)
 
-    # Basemap for geographic context
-    ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron, zoom=12)
+    # Basemap for geographic context (cached tiles, stitched once per extent)
+    tiles.add_basemap(ax, zoom=BASEMAP_ZOOM)
 
     # Legend: hexagon-like markers using Line2D markers (avoids RegularPolygon init issues)
     from matplotlib.lines import Line2D
@@ -200,6 +228,16 @@ for model_name in ["scm", "ascm"]:
         output_dir.mkdir(parents=True, exist_ok=True)
         output_path = output_dir / f"{model_name}_map.png"
         plt.savefig(output_path, dpi=300, bbox_inches="tight", pad_inches=0.08)
-        plt.close()
+        plt.close(fig)
     else:
         plt.show()
+
+
+if __name__ == "__main__":
+    style = PlotStyle()
+    style.apply()
+    units = load_units()
+
+    # -- PLOT BOTH MODELS --
+    for model_name in ["scm", "ascm"]:
+        plot_donor_map(model_name, style, units)
@@ -0,0 +1,291 @@
+"""
+native scm / ridge-augmented scm (ascm) estimator
+mirrors augsynth(progfunc = "none" | "ridge", scm = TRUE) on a donors x periods outcome matrix
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from src._ridge import (
+    choose_lambda,
+    factorize,
+    factorize_gram,
+    lambda_path,
+    loo_predictions,
+    ridge_adjustment,
+    ridge_solve,
+)
+
+
+# -- SIMPLEX-CONSTRAINED LEAST SQUARES --
+def project_simplex(V, mask=None):
+    """Project each column of V onto the probability simplex (restricted to mask rows)."""
+    n, k = V.shape
+    if mask is not None:
+        V = np.where(mask, V, -np.inf)
+    U = -np.sort(-V, axis=0)
+    U[~np.isfinite(U)] = 0.0
+    css = np.cumsum(U, axis=0) - 1
+    ind = np.arange(1, n + 1)[:, None]
+    if mask is None:
+        valid = np.ones_like(U, dtype=bool)
+    else:
+        valid = np.arange(n)[:, None] < mask.sum(axis=0)
+    cond = (U - css / ind > 0) & valid
+    rho = n - 1 - np.argmax(cond[::-1], axis=0)
+    theta = css[rho, np.arange(k)] / (rho + 1)
+    W = np.maximum(V - theta, 0)
+    return W if mask is None else np.where(mask, W, 0.0)
+
+
+def _solve_on_support(gram, rhs):
+    """Equality-constrained least squares on a support: min z'Gz - 2 rhs'z s.t. sum(z) = 1."""
+    k = len(rhs)
+    # scale the constraint row to the gram matrix so lstsq does not treat it as noise
+    c = max(np.trace(gram) / k, 1.0)
+    kkt = np.zeros((k + 1, k + 1))
+    kkt[:k, :k] = gram
+    kkt[:k, k] = c
+    kkt[k, :k] = c
+    return np.linalg.lstsq(kkt, np.append(rhs, c), rcond=None)[0][:k]
+
+
+def _active_set(gram_cols, c, w, donors, cap, tol=1e-10, max_iter=1000):
+    """Primal active-set (Lawson-Hanson style) solve of min w'Kw - 2c'w over the simplex.
+
+    gram_cols(S) returns the columns K[:, S] of the donor gram matrix, so callers can
+    pass a dense K, a factor A with K = AA', or a downdated shared K.
+    Warm-started at w; terminates at an exact KKT point: equal gradients on the
+    support, no improving donor outside it.
+    """
+    support = np.flatnonzero((w > 1e-8) & donors)
+    # an optimal basic solution uses at most cap = T + 1 donors; start from the largest weights
+    if len(support) > cap:
+        support = support[np.argsort(-w[support])[:cap]]
+    if len(support) == 0:
+        support = np.flatnonzero(donors)[:1]
+    w = np.zeros_like(w)
+    w[support] = 1.0 / len(support)
+
+    added = None
+    for _ in range(max_iter):
+        # inner loop: move toward the support solution, dropping donors that hit zero
+        while True:
+            K_s = gram_cols(support)
+            z = _solve_on_support(K_s[support], c[support])
+            if np.all(z > 0):
+                break
+            ws = w[support]
+            neg = z <= 0
+            alpha = np.min(ws[neg] / (ws[neg] - z[neg]))
+            w[support] = ws + alpha * (z - ws)
+            keep = w[support] > 1e-14
+            keep[np.flatnonzero(neg)[np.argmin(ws[neg] / (ws[neg] - z[neg]))]] = False
+            w[support[~keep]] = 0.0
+            support = support[keep]
+        w[:] = 0.0
+        w[support] = z
+        if added is not None and added not in support:
+            # the donor just added was dropped again: numerically stalled at the optimum
+            break
+
+        grad = K_s @ z - c
+        mu = -grad[support].mean()
+        slack = np.where(donors, grad + mu, np.inf)
+        slack[support] = np.inf
+        j = np.argmin(slack)
+        if slack[j] >= -tol * (np.abs(grad).max() + 1.0):
+            break
+        support = np.append(support, j)
+        added = j
+    return w
+
+
+def simplex_lstsq(A, B, donor_mask=None, time_mask=None, init=None, max_iter=100, tol=1e-7):
+    """Solve min_w ||B[:, j] - A.T w||^2 over the simplex for every column j at once.
+
+    A: (n_donors, T) donor outcomes; B: (T,) or (T, k) targets.
+    donor_mask (n_donors, k) restricts which donors column j may use;
+    time_mask (T, k) restricts which periods enter column j's loss.
+    init (n_donors,) or (n_donors, k) warm-starts the solver.
+    Accelerated projected gradient (FISTA with adaptive restart) on all columns
+    together finds the support; an active-set pass per column makes it exact.
+    """
+    single = B.ndim == 1
+    B = B[:, None] if single else B
+    n, T = A.shape
+    k = B.shape[1]
+    donors = np.ones((n, k), dtype=bool) if donor_mask is None else donor_mask
+    periods = np.ones((T, k), dtype=bool) if time_mask is None else time_mask
+
+    step = 1.0 / max(np.linalg.norm(A, 2) ** 2, 1e-12)
+    if init is None:
+        init = np.where(donors, 1.0, 0.0) / donors.sum(axis=0)
+    elif init.ndim == 1:
+        init = np.repeat(init[:, None], k, axis=1)
+    W = project_simplex(init, donors)
+    Z = W.copy()
+    t = np.ones(k)
+    scale = np.maximum(np.sum(B**2, axis=0), 1.0)
+    prev_loss = np.full(k, np.inf)
+
+    for _ in range(max_iter):
+        R = (A.T @ Z - B) * periods
+        W_next = project_simplex(Z - step * (A @ R), donors)
+
+        loss = np.sum(((A.T @ W_next - B) * periods) ** 2, axis=0)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        # restart momentum for columns whose loss went up
+        restart = loss > prev_loss
+        momentum = np.where(restart, 0.0, (t - 1) / t_next)
+        Z = W_next + momentum * (W_next - W)
+        t = np.where(restart, 1.0, t_next)
+
+        converged = np.abs(prev_loss - loss) <= tol * scale
+        W, prev_loss = W_next, np.minimum(loss, prev_loss)
+        if converged.all():
+            break
+
+    cols = []
+    for j in range(k):
+        A_j = A[:, periods[:, j]]
+        cols.append(
+            _active_set(
+                lambda S: A_j @ A_j[S].T, A_j @ B[periods[:, j], j], W[:, j], donors[:, j],
+                cap=A_j.shape[1] + 1,
+            )
+        )
+    W = np.column_stack(cols)
+    return W[:, 0] if single else W
+
+
+# -- RIDGE CV --
+def cv_lambda(X_c, x1_c, factor, lambdas, min_1se=True, init=None):
+    """Leave-one-period-out CV over the pre-period (augsynth cv_lambda, holdout_length = 1).
+
+    factor: ridge factor of X_c; every fold's ridge fit for every lambda comes from it.
+    init: full-sample scm weights; each fold drops one period, so they are a close warm start.
+    """
+    T0 = X_c.shape[1]
+    folds = T0 - 1
+
+    # one batched scm fit per fold, each with its holdout period masked out of the loss
+    time_mask = np.ones((T0, folds), dtype=bool)
+    time_mask[np.arange(folds), np.arange(folds)] = False
+    syn = simplex_lstsq(
+        X_c, np.repeat(x1_c[:, None], folds, axis=1), time_mask=time_mask, init=init
+    )
+
+    # fold residuals over all periods; the held-out one is the scm prediction error
+    resid = x1_c[None, :] - syn.T @ X_c
+    base = resid[np.arange(folds), np.arange(folds)]
+    errors = (base[:, None] - loo_predictions(factor, resid, lambdas)) ** 2
+    return choose_lambda(errors, lambdas, min_1se)
+
+
+# -- ESTIMATOR --
+@dataclass
+class SynthFit:
+    weights: np.ndarray  # (n_donors,)
+    synthetic: np.ndarray  # (T,)
+    att: np.ndarray  # (T,)
+    lambda_: float = None
+
+
+def fit_ascm(
+    Y0,
+    y1,
+    pre,
+    progfunc="ridge",
+    lambda_=None,
+    lambda_min_ratio=1e-8,
+    n_lambda=20,
+    min_1se=True,
+    cache_dir=None,
+):
+    """Fit scm (progfunc="none") or ridge ascm (progfunc="ridge").
+
+    Y0: (n_donors, T) donor outcomes; y1: (T,) treated outcomes; pre: (T,) bool pre-period mask.
+    cache_dir: keep the ridge factorization of each donor pre-period matrix there, so
+    placebo and sensitivity reruns on the same donor set skip the svd.
+    """
+    X0 = Y0[:, pre]
+    x1 = y1[pre]
+    weights = simplex_lstsq(X0, x1)
+
+    if progfunc == "ridge":
+        # center on donor means; the ridge correction then sums to zero
+        factor = factorize(X0, cache_dir)
+        X_c = X0 - factor.means
+        x1_c = x1 - factor.means
+        if lambda_ is None:
+            lambdas = lambda_path(factor, lambda_min_ratio, n_lambda)
+            lambda_, _, _ = cv_lambda(X_c, x1_c, factor, lambdas, min_1se, init=weights)
+        resid = x1_c - X_c.T @ weights
+        weights = weights + ridge_adjustment(factor, resid, [lambda_])[:, 0]
+    elif progfunc != "none":
+        raise ValueError(f"unsupported progfunc {progfunc!r}")
+
+    synthetic = Y0.T @ weights
+    return SynthFit(weights=weights, synthetic=synthetic, att=y1 - synthetic, lambda_=lambda_)
+
+
+# -- BATCHED PLACEBOS --
+def fit_placebos(Y, rows, pre, lambda_min_ratio=1e-8, n_lambda=20, min_1se=True, cache_dir=None):
+    """Ridge ascm att trajectories for every placebo row of Y, donors = all other rows.
+
+    Same fits as fit_ascm(np.delete(Y, r, 0), Y[r], pre) for each r in rows, but the
+    placebos share one unit gram matrix K = XX' (X = pre-period outcomes): each
+    cv fold drops a period via the rank-one downdate K - x_i x_i', and each placebo's
+    centered period gram G comes from rank-one updates of the shared X'X. One
+    eigendecomposition of G gives that placebo's lambda path, cv and ridge correction
+    (cached under cache_dir like fit_ascm's svd).
+    Returns (len(rows), T).
+    """
+    Y = np.asarray(Y, dtype=float)
+    n, T = Y.shape
+    X = Y[:, pre]
+    T0 = X.shape[1]
+    folds = T0 - 1
+
+    K = X @ X.T
+    XtX = X.T @ X
+    col_sum = X.sum(axis=0)
+
+    att = np.empty((len(rows), T))
+    for out, r in enumerate(rows):
+        donors = np.ones(n, dtype=bool)
+        donors[r] = False
+        c = K[:, r]
+
+        # -- scm: active set from the best single donor --
+        start = np.zeros(n)
+        start[np.argmin(np.where(donors, np.diag(K) - 2 * c, np.inf))] = 1.0
+        w_scm = _active_set(lambda S: K[S].T, c, start, donors, cap=T0 + 1)
+
+        # -- centered gram of this donor pool (drop unit r, then center) --
+        x_r = X[r]
+        means = (col_sum - x_r) / (n - 1)
+        G = XtX - np.outer(x_r, x_r) - (n - 1) * np.outer(means, means)
+        factor = factorize_gram(G, means, cache_dir)
+        lambdas = lambda_path(factor, lambda_min_ratio, n_lambda)
+
+        # -- cv folds: scm on the downdated gram, ridge from the one factorization --
+        resid = np.empty((folds, T0))
+        for i in range(folds):
+            a = X[:, i]
+            w_i = _active_set(
+                lambda S: K[S].T - np.outer(a, a[S]), c - a * a[r], w_scm, donors, cap=T0
+            )
+            resid[i] = x_r - w_i @ X
+        base = resid[np.arange(folds), np.arange(folds)]
+        errors = (base[:, None] - loo_predictions(factor, resid, lambdas)) ** 2
+        lambda_, _, _ = choose_lambda(errors, lambdas, min_1se)
+
+        # -- ridge correction: delta = X_c (G + lambda I)^-1 resid --
+        v = ridge_solve(factor, x_r - w_scm @ X, [lambda_])[:, 0]
+        delta = np.where(donors, X @ v - means @ v, 0.0)
+        synthetic = (w_scm + delta) @ Y
+        att[out] = Y[r] - synthetic
+    return att
@@ -0,0 +1,83 @@
+"""
+intervention designs for batch estimation: treated hexes and donor pools of many
+interventions at once, as boolean (interventions x hexes) masks
+"""
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+
+
+def read_interventions(path, crs="EPSG:3857"):
+    """Read the intervention table; WKT columns are EPSG:4326 and returned in crs.
+
+    Columns: intervention, treatment_date and at least one of geometry (WKT of the
+    treated area or a point in it) and hex_ids (';'-separated). Optional: exclude
+    (WKT of areas whose hexes leave the donor pool) and exclude_neighbors (default
+    true; drops hexes touching a treated hex).
+    """
+    table = pd.read_csv(path, dtype={"hex_ids": str, "geometry": str, "exclude": str})
+    if table["intervention"].duplicated().any():
+        raise ValueError(f"{path}: intervention names must be unique")
+
+    for col in ("geometry", "exclude"):
+        wkt = table[col] if col in table else pd.Series(None, index=table.index)
+        table[col] = gpd.GeoSeries.from_wkt(wkt, crs="EPSG:4326").to_crs(crs).values
+    hex_ids = table["hex_ids"] if "hex_ids" in table else pd.Series(None, index=table.index)
+    table["hex_ids"] = [
+        [int(h) for h in ids.split(";")] if isinstance(ids, str) else [] for ids in hex_ids
+    ]
+    if "exclude_neighbors" not in table:
+        table["exclude_neighbors"] = True
+    table["exclude_neighbors"] = table["exclude_neighbors"].fillna(True).astype(bool)
+    table["treatment_date"] = pd.to_datetime(table["treatment_date"])
+    return table
+
+
+def _intersecting(tree, geoms, n_hexes):
+    """(len(geoms) x n_hexes) mask of the hexes each geometry intersects (None = none)."""
+    mask = np.zeros((len(geoms), n_hexes), dtype=bool)
+    present = np.flatnonzero(~shapely.is_missing(geoms))
+    rows, cols = tree.query(geoms[present], predicate="intersects")
+    mask[present[rows], cols] = True
+    return mask
+
+
+def design_masks(interventions, hex_gdf, exclude_other_treated=True, crs="EPSG:3857"):
+    """Treated and donor masks (interventions x hexes, in hex_gdf row order).
+
+    The donor pool of each intervention is every hex except its treated hexes, their
+    queen-contiguous neighbours (if exclude_neighbors), hexes intersecting its exclude
+    area and, with exclude_other_treated, hexes treated by any other intervention.
+    """
+    geoms = hex_gdf.to_crs(crs).geometry.values
+    tree = shapely.STRtree(geoms)
+    n_hexes = len(geoms)
+
+    # treated: geometry hits plus explicit hex sets
+    treated = _intersecting(tree, interventions["geometry"].values, n_hexes)
+    position = pd.Series(np.arange(n_hexes), index=hex_gdf["hex_id"].values)
+    listed = interventions["hex_ids"].reset_index(drop=True).explode().dropna()
+    unknown = set(listed) - set(position.index)
+    if unknown:
+        raise ValueError(f"hex_ids not in the grid: {sorted(unknown)}")
+    treated[listed.index.values, position[listed.values].values] = True
+    if not treated.any(axis=1).all():
+        empty = interventions["intervention"].values[~treated.any(axis=1)]
+        raise ValueError(f"no treated hexes for: {', '.join(empty)}")
+
+    # queen contiguity once for the whole grid, then one product for all designs;
+    # a small tolerance instead of touches, which misses float-sized gaps between hexes
+    i, j = tree.query(geoms, predicate="dwithin", distance=1e-6)
+    i, j = i[i != j], j[i != j]
+    touches = sparse.csr_matrix((np.ones(len(i), dtype=np.int32), (i, j)), (n_hexes, n_hexes))
+    neighbors = (touches @ sparse.csr_matrix(treated.T.astype(np.int32))).T.toarray() > 0
+    neighbors &= interventions["exclude_neighbors"].values[:, None]
+
+    excluded = treated | neighbors
+    excluded |= _intersecting(tree, interventions["exclude"].values, n_hexes)
+    if exclude_other_treated:
+        excluded |= (treated.sum(axis=0) - treated) > 0
+    return treated, ~excluded
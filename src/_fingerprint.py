@@ -0,0 +1,35 @@
+"""
+content fingerprints for resumable outputs (placebo checkpoints, robustness parts): a hash
+of the input arrays, the settings that shape the results and the estimator source code,
+so finished work is only reused when rerunning would give the same result
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+# modules whose code determines every scm / ascm fit
+ESTIMATOR_MODULES = ["_ascm.py", "_ridge.py"]
+
+
+def estimator_version():
+    """Hash of the estimator source files."""
+    h = hashlib.sha256()
+    for name in ESTIMATOR_MODULES:
+        h.update((Path(__file__).parent / name).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def fingerprint(*arrays, **settings):
+    """Hash of the arrays, the settings (json-serializable) and the estimator version."""
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.asarray(array)
+        if array.dtype.kind == "f":
+            array = np.ascontiguousarray(array, dtype=float)
+        h.update(array.tobytes())
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    h.update(estimator_version().encode())
+    return h.hexdigest()[:16]
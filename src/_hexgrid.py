@@ -0,0 +1,169 @@
+"""
+hexagonal grid helpers
+flat-topped hexagons, columns spaced 1.5 * radius, odd columns shifted up by half a row
+"""
+
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+def hex_centers(center_x, center_y, bounds, radius):
+    """Return (col, row, x, y) arrays for every grid cell whose center lies within bounds +/- radius."""
+    minx, miny, maxx, maxy = bounds
+    dx = radius * 1.5
+    dy = radius * np.sqrt(3)
+
+    col_range = int((max(abs(center_x - minx), abs(maxx - center_x)) / dx) + 2)
+    row_range = int((max(abs(center_y - miny), abs(maxy - center_y)) / dy) + 2)
+
+    cols, rows = np.meshgrid(
+        np.arange(-col_range, col_range),
+        np.arange(-row_range, row_range),
+        indexing="ij",
+    )
+    cols = cols.ravel()
+    rows = rows.ravel()
+
+    cx = center_x + cols * dx
+    cy = center_y + rows * dy + np.where(cols % 2 == 1, dy / 2, 0)
+
+    # filter on centers before any geometry is built
+    keep = (
+        (cx >= minx - radius)
+        & (cx <= maxx + radius)
+        & (cy >= miny - radius)
+        & (cy <= maxy + radius)
+    )
+    return cols[keep], rows[keep], cx[keep], cy[keep]
+
+
+def hex_polygons(cx, cy, radius):
+    """Build hexagon polygons for arrays of centers in one shapely call."""
+    angles = np.linspace(0, 2 * np.pi, 7)
+    x = cx[:, None] + radius * np.cos(angles)
+    y = cy[:, None] + radius * np.sin(angles)
+    return shapely.polygons(np.stack([x, y], axis=-1))
+
+
+def hex_grid(center_x, center_y, bounds, radius, crs="EPSG:3857"):
+    """Hexagonal grid centered on (center_x, center_y) covering bounds, in projected units of crs."""
+    _, _, cx, cy = hex_centers(center_x, center_y, bounds, radius)
+    hex_gdf = gpd.GeoDataFrame(
+        {"geometry": hex_polygons(cx, cy, radius)}, crs=crs
+    )
+    hex_gdf["hex_id"] = range(len(hex_gdf))
+    return hex_gdf
+
+
+def point_to_cell(x, y, center_x, center_y, radius):
+    """Return (col, row) offset coordinates of the grid cell containing each point."""
+    px = (np.asarray(x, dtype=float) - center_x) / radius
+    py = (np.asarray(y, dtype=float) - center_y) / radius
+
+    # fractional axial coordinates
+    q = px * 2 / 3
+    r = py / np.sqrt(3) - q / 2
+    s = -q - r
+
+    # cube rounding: fix the component with the largest rounding error
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+
+    # axial -> offset (odd columns shifted up)
+    col = rq.astype(np.int64)
+    row = rr.astype(np.int64) + (col - (col & 1)) // 2
+    return col, row
+
+
+def ring_distance(cols, rows, col, row):
+    """Number of hex rings between cell (col, row) and each cell (0 = same, 1 = touching)."""
+    # offset -> axial coordinates (inverse of the conversion in point_to_cell)
+    cols, rows = np.asarray(cols), np.asarray(rows)
+    r = rows - (cols - (cols & 1)) // 2
+    r0 = row - (col - (col & 1)) // 2
+    dq, dr = cols - col, r - r0
+    return (np.abs(dq) + np.abs(dr) + np.abs(dq + dr)) // 2
+
+
+def within_zones(geoms, zones, distances=0):
+    """Mask of geoms within distances (per zone, crs units) of any zone, in one STRtree query.
+
+    A distance of 0 selects geoms intersecting (or touching) the zone.
+    """
+    mask = np.zeros(len(geoms), dtype=bool)
+    if len(zones) > 0:
+        tree = shapely.STRtree(geoms)
+        _, hits = tree.query(zones, predicate="dwithin", distance=distances)
+        mask[hits] = True
+    return mask
+
+
+def save_grid_params(path, center_x, center_y, radius, crs="EPSG:3857"):
+    params = {
+        "center_x": float(center_x),
+        "center_y": float(center_y),
+        "radius": float(radius),
+        "crs": str(crs),
+    }
+    with open(path, "w") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_grid_params(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+SWEEP_DIR = "data/radius_sweep"
+
+
+def sweep_paths(radius, sweep_dir=SWEEP_DIR):
+    """(hexagons parquet, grid params json) of the radius sweep grid at radius."""
+    stem = Path(sweep_dir) / f"berlin_hexagons_{radius:g}m"
+    return stem.with_suffix(".parquet"), stem.with_suffix(".json")
+
+
+class HexIndex:
+    """Closed-form point -> hex_id lookup for a grid built by hex_grid()."""
+
+    def __init__(self, center_x, center_y, radius, cols, rows, hex_ids, crs="EPSG:3857"):
+        self.center_x = center_x
+        self.center_y = center_y
+        self.radius = radius
+        self.crs = crs
+
+        # dense (col, row) -> hex_id table, -1 for cells outside the grid
+        self.col_min = int(cols.min())
+        self.row_min = int(rows.min())
+        shape = (int(cols.max()) - self.col_min + 1, int(rows.max()) - self.row_min + 1)
+        self.table = np.full(shape, -1, dtype=np.int64)
+        self.table[cols - self.col_min, rows - self.row_min] = hex_ids
+
+    @classmethod
+    def from_hexagons(cls, hex_gdf, center_x, center_y, radius, crs="EPSG:3857"):
+        centroids = hex_gdf.to_crs(crs).geometry.centroid
+        cols, rows = point_to_cell(
+            centroids.x.values, centroids.y.values, center_x, center_y, radius
+        )
+        return cls(
+            center_x, center_y, radius, cols, rows, hex_gdf["hex_id"].values, crs=crs
+        )
+
+    def lookup(self, x, y):
+        """Return hex_id for each point (in the grid crs), -1 where no hex contains it."""
+        col, row = point_to_cell(x, y, self.center_x, self.center_y, self.radius)
+        i = col - self.col_min
+        j = row - self.row_min
+        inside = (i >= 0) & (i < self.table.shape[0]) & (j >= 0) & (j < self.table.shape[1])
+
+        hex_ids = np.full(len(i), -1, dtype=np.int64)
+        hex_ids[inside] = self.table[i[inside], j[inside]]
+        return hex_ids
@@ -0,0 +1,176 @@
+"""
+per-period att inference for scm / ascm fits: jackknife+ over the pre-periods (standard
+errors and bands) and conformal intervals (chernozhukov, wuthrich & zhu 2021); all
+refits of a method are solved as one batched simplex problem, and the permutation
+statistics of every residual vector come from one indexing operation
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src._ascm import simplex_lstsq
+from src._ridge import factorize, ridge_adjustment
+
+
+# -- BATCHED REFITS --
+def refit(A, B, periods, lambda_=None, init=None):
+    """Weights of k scm fits (lambda_ None) or ridge ascm fits at a fixed lambda at once.
+
+    A: (n_donors, T) donor outcomes; B: (T, k) treated targets; periods: (T, k) mask of
+    the periods each fit uses. Returns (n_donors, k).
+    """
+    W = simplex_lstsq(A, B, time_mask=periods, init=init)
+    if lambda_ is None:
+        return W
+
+    # ridge correction as in fit_ascm, one factorization per distinct period set
+    masks, group = np.unique(periods.T, axis=0, return_inverse=True)
+    for g, mask in enumerate(masks):
+        cols = np.flatnonzero(group.ravel() == g)
+        X = A[:, mask]
+        factor = factorize(X)
+        resid = B[mask][:, cols] - X.T @ W[:, cols]
+        for j, col in enumerate(cols):
+            W[:, col] += ridge_adjustment(factor, resid[:, j], [lambda_])[:, 0]
+    return W
+
+
+def block_pvalues(U, q=1):
+    """Moving-block permutation p-values for the last q periods of each residual vector.
+
+    U: (k, m) residuals, the periods under test last. Every cyclic shift of the m
+    periods is one permutation; the statistic is sum(|u|) / sqrt(q) over the last q.
+    """
+    k, m = U.shape
+    # positions that land in the last q slots under each of the m shifts
+    idx = (np.arange(m - q, m)[None, :] + np.arange(m)[:, None]) % m
+    stats = np.abs(U[:, idx]).sum(axis=2) / np.sqrt(q)
+    return (stats >= stats[:, :1]).mean(axis=1)
+
+
+# -- JACKKNIFE+ --
+def jackknife_plus(Y0, y1, pre, lambda_=None, weights=None, alpha=0.05):
+    """Leave-one-pre-period-out refits: per-period std_error and jackknife+ att bands.
+
+    Returns (std_error, lower, upper), each (T,); bands are NaN in the pre-period.
+    """
+    T = len(y1)
+    folds = np.flatnonzero(pre)
+    n = len(folds)
+    periods = np.repeat(pre[:, None], n, axis=1)
+    periods[folds, np.arange(n)] = False
+
+    W = refit(Y0, np.repeat(y1[:, None], n, axis=1), periods, lambda_, weights)
+    att = y1[:, None] - Y0.T @ W  # (T, n): every period under every fold
+    held_out = np.abs(att[folds, np.arange(n)])
+
+    spread = att - att.mean(axis=1, keepdims=True)
+    std_error = np.sqrt((n - 1) / n * (spread**2).sum(axis=1))
+
+    # barber et al. (2021): order statistics of att -/+ the held-out residuals
+    k_lo = int(np.floor(alpha * (n + 1)))
+    k_hi = int(np.ceil((1 - alpha) * (n + 1)))
+    lower = np.sort(att - held_out, axis=1)[:, k_lo - 1] if k_lo >= 1 else np.full(T, -np.inf)
+    upper = np.sort(att + held_out, axis=1)[:, k_hi - 1] if k_hi <= n else np.full(T, np.inf)
+    lower[pre] = upper[pre] = np.nan
+    return std_error, lower, upper
+
+
+# -- CONFORMAL --
+_Y0 = _Y1 = _PRE = _LAMBDA = _WEIGHTS = None
+
+
+def _init_worker(Y0, y1, pre, lambda_, weights):
+    global _Y0, _Y1, _PRE, _LAMBDA, _WEIGHTS
+    _Y0, _Y1, _PRE, _LAMBDA, _WEIGHTS = Y0, y1, pre, lambda_, weights
+
+
+def _conformal_chunk(task):
+    """p-values of every null effect in grids (len(periods), G) for a chunk of post periods."""
+    periods, grids = task
+    T = len(_Y1)
+    G = grids.shape[1]
+    t = np.repeat(periods, G)
+
+    # one column per (period, null): the null effect is removed from y1[t] and period t
+    # joins the pre-period in the fit
+    B = np.repeat(_Y1[:, None], len(t), axis=1)
+    B[t, np.arange(len(t))] -= grids.ravel()
+    mask = _PRE[:, None] | (np.arange(T)[:, None] == t[None, :])
+    W = refit(_Y0, B, mask, _LAMBDA, _WEIGHTS)
+
+    resid = B - _Y0.T @ W
+    U = np.column_stack([resid[_PRE].T, resid[t, np.arange(len(t))]])
+    return block_pvalues(U).reshape(len(periods), G)
+
+
+def conformal(
+    Y0,
+    y1,
+    pre,
+    att,
+    lambda_=None,
+    weights=None,
+    alpha=0.05,
+    grid_size=50,
+    max_workers=None,
+    chunk_size=8,
+):
+    """Conformal att intervals and p-values (null: no effect) for every post period.
+
+    For each period the null effects on a grid of att +/- 2 max|att| are tested by
+    refitting with the period added to the pre-period; the interval is the range of
+    nulls not rejected at alpha (clipped to the grid). Chunks of post periods are
+    fit in parallel. Returns (lower, upper, p_value), each (T,), NaN in the pre-period.
+    """
+    T = len(y1)
+    post = np.flatnonzero(~pre)
+    width = 2 * np.abs(att).max()
+    # the last null of every grid is 0, for the p-value
+    grids = np.column_stack(
+        [att[post, None] + np.linspace(-width, width, grid_size)[None, :], np.zeros(len(post))]
+    )
+
+    chunks = [
+        (post[i : i + chunk_size], grids[i : i + chunk_size])
+        for i in range(0, len(post), chunk_size)
+    ]
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(Y0, y1, pre, lambda_, weights),
+    ) as executor:
+        p = np.vstack(list(executor.map(_conformal_chunk, chunks)))
+
+    accepted = p[:, :-1] > alpha
+    lower, upper, p_value = (np.full(T, np.nan) for _ in range(3))
+    # periods where every null is rejected keep a NaN band
+    some = accepted.any(axis=1)
+    lower[post[some]] = np.where(accepted, grids[:, :-1], np.inf)[some].min(axis=1)
+    upper[post[some]] = np.where(accepted, grids[:, :-1], -np.inf)[some].max(axis=1)
+    p_value[post] = p[:, -1]
+    return lower, upper, p_value
+
+
+# -- ENTRY POINT --
+def att_inference(
+    Y0, y1, pre, fit, method="conformal", alpha=0.05, grid_size=50, max_workers=None
+):
+    """std_error, lower_bound, upper_bound and p_value per period for a SynthFit.
+
+    std_error always comes from the jackknife over pre-periods; the bands from method,
+    "conformal" or "jackknife+" (which has no p-value). Refits keep the fit's lambda.
+    """
+    std_error, lower, upper = jackknife_plus(Y0, y1, pre, fit.lambda_, fit.weights, alpha)
+    p_value = np.full(len(y1), np.nan)
+    if method == "conformal":
+        lower, upper, p_value = conformal(
+            Y0, y1, pre, fit.att, fit.lambda_, fit.weights, alpha, grid_size, max_workers
+        )
+    elif method != "jackknife+":
+        raise ValueError(f"unsupported inference method {method!r}")
+    return pd.DataFrame(
+        {"std_error": std_error, "lower_bound": lower, "upper_bound": upper, "p_value": p_value}
+    )
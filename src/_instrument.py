@@ -0,0 +1,130 @@
+"""
+lightweight run instrumentation: wall time, rss, row counts and output sizes of
+named sections, written as a json report at exit when RUN_REPORT is set
+(src/pipeline.py sets it for every stage and merges the reports into one run report)
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # windows: no getrusage, peak rss is reported as null
+    resource = None
+
+
+REPORT_ENV = "RUN_REPORT"
+
+_SECTIONS = []
+_START = time.perf_counter()
+_PID = os.getpid()
+
+
+def _proc_status_mb(field):
+    """A memory field of /proc/self/status in MB (None where there is no /proc)."""
+    if not os.path.exists("/proc/self/status"):
+        return None
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (linux only, else None)."""
+    return _proc_status_mb("VmRSS")
+
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process (or of its largest child so far) in MB."""
+    if not children and os.path.exists("/proc/self/status"):
+        # linux keeps ru_maxrss across exec, so a fresh script would report its
+        # parent's peak; VmHWM belongs to this process image only
+        return _proc_status_mb("VmHWM")
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return round(peak / (1024**2 if sys.platform == "darwin" else 1024), 1)
+
+
+def output_size(path):
+    """Bytes of a file or of every file under a directory (None if it does not exist)."""
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else None
+
+
+def record(name, **fields):
+    """Add a section measured elsewhere, e.g. timings returned by pool workers."""
+    _SECTIONS.append({"section": name, **fields})
+
+
+@contextmanager
+def section(name, outputs=(), **fields):
+    """Time a block and record its rss change and the size of its outputs.
+
+    rss_delta_mb is the resident memory the block left behind (its own peak may be
+    higher); process_peak_rss_mb is the high-water mark of the whole process so far,
+    so it only measures the block when the block set a new peak.
+
+    The yielded dict takes extra fields such as row counts:
+        with section("daily_hex_counts") as s:
+            daily = ...
+            s["rows"] = len(daily)
+    """
+    entry = {"section": name, **fields}
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    try:
+        yield entry
+    except BaseException as e:
+        entry["error"] = type(e).__name__
+        raise
+    finally:
+        entry["wall_s"] = round(time.perf_counter() - start, 4)
+        entry["rss_mb"] = rss_mb()
+        if rss_start is not None:
+            entry["rss_delta_mb"] = round(entry["rss_mb"] - rss_start, 1)
+        entry["process_peak_rss_mb"] = peak_rss_mb()
+        if outputs:
+            entry["outputs"] = {str(path): output_size(path) for path in outputs}
+        _SECTIONS.append(entry)
+
+
+def report():
+    """Run report of this process: totals plus every recorded section."""
+    return {
+        "script": sys.argv[0],
+        "wall_s": round(time.perf_counter() - _START, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_children_mb": peak_rss_mb(children=True),
+        "sections": list(_SECTIONS),
+    }
+
+
+def _json_default(value):
+    # numpy scalars (hex ids, counts) and paths
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+@atexit.register
+def _write_report():
+    path = os.environ.get(REPORT_ENV)
+    # pool workers inherit the module (and the variable) but must not overwrite the report
+    if not path or os.getpid() != _PID:
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(report(), f, indent=2, default=_json_default)
+    tmp.replace(path)
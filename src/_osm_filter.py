@@ -0,0 +1,119 @@
+"""
+parser for the ohsome filter language subset used in 2_features.py
+(key=value, key=*, key!=value, key!=*, type:node|way|relation, and/or/not, parentheses)
+so the api and local pbf backends share one definition of each feature
+"""
+
+import re
+
+
+OSM_TYPES = frozenset({"node", "way", "relation"})
+
+_TOKEN = re.compile(r"\s*(\(|\)|[^\s()]+)")
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise ValueError(f"cannot parse filter at {text[pos:]!r}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+class OsmFilter:
+    """Compiled ohsome filter: matches(tags, osm_type) evaluates it on a tag dict.
+
+    keys: tag keys the filter looks at
+    types: osm types the filter can match at all
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.keys = set()
+        self._tokens = _tokenize(text)
+        self._pos = 0
+        self._predicate, self.types = self._parse_or()
+        if self._pos != len(self._tokens):
+            raise ValueError(f"unexpected {self._tokens[self._pos]!r} in filter {text!r}")
+        del self._tokens
+
+    def matches(self, tags, osm_type):
+        return self._predicate(tags, osm_type)
+
+    # -- RECURSIVE DESCENT --
+    # each rule returns (predicate, set of osm types it can match)
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError(f"unexpected end of filter {self.text!r}")
+        self._pos += 1
+        return token
+
+    def _parse_or(self):
+        terms = [self._parse_and()]
+        while self._peek() == "or":
+            self._next()
+            terms.append(self._parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        preds = [p for p, _ in terms]
+        types = frozenset().union(*(t for _, t in terms))
+        return (lambda tags, osm_type: any(p(tags, osm_type) for p in preds)), types
+
+    def _parse_and(self):
+        terms = [self._parse_not()]
+        while self._peek() == "and":
+            self._next()
+            terms.append(self._parse_not())
+        if len(terms) == 1:
+            return terms[0]
+        preds = [p for p, _ in terms]
+        types = OSM_TYPES.intersection(*(t for _, t in terms))
+        return (lambda tags, osm_type: all(p(tags, osm_type) for p in preds)), types
+
+    def _parse_not(self):
+        if self._peek() == "not":
+            self._next()
+            pred, _ = self._parse_not()
+            return (lambda tags, osm_type: not pred(tags, osm_type)), OSM_TYPES
+        return self._parse_atom()
+
+    def _parse_atom(self):
+        token = self._next()
+        if token == "(":
+            expr = self._parse_or()
+            if self._next() != ")":
+                raise ValueError(f"unbalanced parentheses in filter {self.text!r}")
+            return expr
+        return self._parse_term(token)
+
+    def _parse_term(self, token):
+        if token.startswith("type:"):
+            wanted = token[len("type:"):]
+            if wanted not in OSM_TYPES:
+                raise ValueError(f"unknown osm type {wanted!r} in filter {self.text!r}")
+            return (lambda tags, osm_type: osm_type == wanted), frozenset({wanted})
+
+        if "!=" in token:
+            key, value = token.split("!=", 1)
+            self.keys.add(key)
+            if value == "*":
+                return (lambda tags, osm_type: key not in tags), OSM_TYPES
+            return (lambda tags, osm_type: tags.get(key) != value), OSM_TYPES
+
+        if "=" in token:
+            key, value = token.split("=", 1)
+            self.keys.add(key)
+            if value == "*":
+                return (lambda tags, osm_type: key in tags), OSM_TYPES
+            return (lambda tags, osm_type: tags.get(key) == value), OSM_TYPES
+
+        raise ValueError(f"unsupported term {token!r} in filter {self.text!r}")
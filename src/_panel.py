@@ -0,0 +1,259 @@
+"""
+panel completion, incremental update and wide (units x weeks) matrix helpers
+"""
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# rows of the wide matrix are grouped by unit type in this order, so every group
+# is a contiguous slice
+UNIT_TYPES = ("treated", "donor", "excluded")
+UNIT_TYPE = pd.CategoricalDtype(UNIT_TYPES)
+
+# compact panel schema: ~11 bytes per row instead of ~24 plus a python string
+PANEL_DTYPES = {
+    "hex_id": np.int32,
+    "time": np.int16,  # widened to int32 when the time range does not fit (e.g. hours)
+    "trips": np.float32,
+    "unit_type": UNIT_TYPE,
+}
+
+
+def _time_dtype(times):
+    info = np.iinfo(PANEL_DTYPES["time"])
+    if len(times) == 0 or (info.min <= min(times) and max(times) <= info.max):
+        return PANEL_DTYPES["time"]
+    return np.int32
+
+
+def compact_panel(panel):
+    """Cast a (hex_id, time, trips[, unit_type]) panel to PANEL_DTYPES."""
+    dtypes = {col: dtype for col, dtype in PANEL_DTYPES.items() if col in panel}
+    dtypes["time"] = _time_dtype(panel["time"])
+    return panel.astype(dtypes)
+
+
+def complete_panel(counts, hexes, times, hex_info=None):
+    """Place (hex_id, time, trips) rows on the full hexes x times grid, filling zeros.
+
+    Each column is allocated once at its PANEL_DTYPES dtype, so the grid is never
+    materialized as a MultiIndex and copied by reindex/reset_index/merge. With
+    hex_info (hex_id, unit_type) the unit type is attached per hex, not per row.
+    """
+    hexes = np.asarray(hexes, dtype=PANEL_DTYPES["hex_id"])
+    times = np.asarray(times, dtype=_time_dtype(times))
+    n_times = len(times)
+
+    trips = np.zeros(len(hexes) * n_times, dtype=PANEL_DTYPES["trips"])
+    if len(counts) > 0 and n_times > 0:
+        # grid position of every count; rows outside the grid are dropped
+        order = np.argsort(hexes, kind="stable")
+        h = np.searchsorted(hexes, counts["hex_id"].values, sorter=order)
+        h = order[h.clip(max=len(hexes) - 1)]
+        t = np.searchsorted(times, counts["time"].values).clip(max=n_times - 1)
+        keep = (hexes[h] == counts["hex_id"].values) & (times[t] == counts["time"].values)
+        trips[h[keep] * n_times + t[keep]] = counts["trips"].values[keep]
+
+    columns = {
+        "hex_id": np.repeat(hexes, n_times),
+        "time": np.tile(times, len(hexes)),
+        "trips": trips,
+    }
+    if hex_info is not None:
+        unit_type = (
+            hex_info.set_index("hex_id")["unit_type"].reindex(hexes).astype(UNIT_TYPE)
+        )
+        columns["unit_type"] = pd.Categorical.from_codes(
+            np.repeat(unit_type.cat.codes.values, n_times), dtype=UNIT_TYPE
+        )
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_state(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(path, treatment_date, last_week):
+    state = {"treatment_date": treatment_date, "last_week": int(last_week)}
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def watermark_date(treatment_date, last_week):
+    """First day of the watermark week; that week may have been partial, so it is re-aggregated."""
+    return (pd.Timestamp(treatment_date) + pd.Timedelta(weeks=last_week)).strftime(
+        "%Y-%m-%d"
+    )
+
+
+def merge_incremental(panel, new_counts, watermark, hex_info):
+    """Replace weeks >= watermark in panel with new_counts, completing only the new cells.
+
+    new_counts holds (hex_id, time, trips) rows aggregated from the watermark week onward.
+    Hexes that first show up in new_counts are back-filled with zeros for earlier weeks.
+    """
+    if new_counts.empty:
+        return panel
+
+    kept = compact_panel(panel[panel["time"] < watermark])
+    old_hexes = kept["hex_id"].unique()
+    seen_hexes = new_counts["hex_id"].unique()
+    hexes = np.union1d(old_hexes, seen_hexes)
+
+    parts = [kept]
+
+    new_times = range(watermark, new_counts["time"].max() + 1)
+    parts.append(complete_panel(new_counts, hexes, new_times, hex_info))
+
+    first_seen = np.setdiff1d(seen_hexes, old_hexes)
+    if len(first_seen) > 0 and not kept.empty:
+        old_times = range(kept["time"].min(), watermark)
+        parts.append(complete_panel(new_counts.iloc[:0], first_seen, old_times, hex_info))
+
+    # parts may differ in time dtype (int16 vs int32), so recast after concat
+    return compact_panel(
+        pd.concat(parts, ignore_index=True)
+        .sort_values(["hex_id", "time"])
+        .reset_index(drop=True)
+    )
+
+
+# -- TEMPORAL RESOLUTIONS --
+# bin width in days; months follow the calendar (see bin_days)
+RESOLUTIONS = {"day": 1, "week": 7, "month": None}
+PANEL_NAMES = {"day": "panel_daily", "week": "panel_weekly", "month": "panel_monthly"}
+
+
+def panel_name(resolution):
+    """File stem of the panel at a resolution, e.g. panel_weekly or panel_14d."""
+    return PANEL_NAMES.get(resolution, f"panel_{resolution}d")
+
+
+def merge_daily(daily, new_days):
+    """Replace days >= the first day of new_days in a cached (hex_id, date, trips) aggregate."""
+    if new_days.empty:
+        return daily
+    kept = daily[daily["date"] < new_days["date"].min()]
+    return (
+        pd.concat([kept, new_days], ignore_index=True)
+        .sort_values(["hex_id", "date"])
+        .reset_index(drop=True)
+    )
+
+
+def _bin_width(resolution):
+    width = RESOLUTIONS.get(resolution, resolution)
+    if not isinstance(width, int) or width < 1:
+        raise ValueError(
+            f"resolution must be one of {list(RESOLUTIONS)} or a width in days, "
+            f"not {resolution!r}"
+        )
+    return width
+
+
+def bin_of(dates, treatment_date, resolution="week"):
+    """Bin (time) of each date at a resolution, as in bin_days."""
+    t0 = pd.Timestamp(treatment_date)
+    dates = pd.DatetimeIndex(dates)
+    if resolution == "month":
+        time = (dates.year - t0.year) * 12 + dates.month - t0.month - (dates.day < t0.day)
+    else:
+        time = (dates - t0).days // _bin_width(resolution)
+    return np.asarray(time, dtype=np.int32)
+
+
+def bin_days(daily, treatment_date, resolution="week", start_date=None, end_date=None):
+    """Sum (hex_id, date, trips) days into (hex_id, time) bins centered on treatment_date.
+
+    resolution is "day", "week", "month" or a bin width in days. Bin 0 starts on
+    treatment_date; months run from its day of month (e.g. the 21st to the 20th).
+    Days outside [start_date, end_date) are dropped first.
+    """
+    if start_date is not None:
+        daily = daily[daily["date"] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        daily = daily[daily["date"] < pd.Timestamp(end_date)]
+
+    time = bin_of(daily["date"], treatment_date, resolution)
+    return (
+        daily.assign(time=time)
+        .groupby(["hex_id", "time"], as_index=False, sort=True)["trips"]
+        .sum()
+    )
+
+
+# -- WIDE OUTCOME MATRIX --
+@dataclass
+class WidePanel:
+    """Dense units x weeks trips matrix with its index arrays (see write_wide)."""
+
+    trips: np.ndarray  # (n_units, n_weeks) float32, memory-mapped when loaded
+    hex_id: np.ndarray  # (n_units,)
+    time: np.ndarray  # (n_weeks,) consecutive weeks
+    unit_type: np.ndarray  # (n_units,) codes into UNIT_TYPES
+
+    def rows(self, *kinds):
+        """Row slice covering the given (adjacent) unit types, e.g. rows("treated", "donor")."""
+        codes = [UNIT_TYPES.index(kind) for kind in kinds]
+        start = np.searchsorted(self.unit_type, min(codes), side="left")
+        stop = np.searchsorted(self.unit_type, max(codes), side="right")
+        return slice(int(start), int(stop))
+
+    def weeks(self, first=None, last=None):
+        """Column slice for weeks first..last (inclusive); None leaves that side open."""
+        start = 0 if first is None else np.searchsorted(self.time, first, side="left")
+        stop = len(self.time) if last is None else np.searchsorted(self.time, last, side="right")
+        return slice(int(start), int(stop))
+
+
+def to_wide(panel):
+    """Lay a long (hex_id, time, trips, unit_type) panel out as a WidePanel."""
+    unit_type = panel.groupby("hex_id", sort=True)["unit_type"].first()
+    codes = unit_type.astype(UNIT_TYPE).cat.codes
+    if (codes < 0).any():
+        raise ValueError(f"unexpected unit_type values: {sorted(set(unit_type[codes < 0]))}")
+    order = np.lexsort((codes.index.values, codes.values))
+    hex_ids = codes.index.values[order]
+    times = np.arange(panel["time"].min(), panel["time"].max() + 1, dtype=panel["time"].dtype)
+
+    # fill by position rather than pivot, which would copy the long frame again
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    rows = rank[np.searchsorted(codes.index.values, panel["hex_id"].values)]
+    cols = panel["time"].values.astype(np.intp) - times[0]
+    trips = np.zeros((len(hex_ids), len(times)), dtype=np.float32)
+    trips[rows, cols] = panel["trips"].values
+    return WidePanel(trips, hex_ids, times, codes.values[order].astype(np.int8))
+
+
+def write_wide(wide, path):
+    """Save a WidePanel as a directory of .npy files (trips.npy is memory-mappable)."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name in ("trips", "hex_id", "time", "unit_type"):
+        np.save(path / f"{name}.npy", getattr(wide, name))
+    with open(path / "unit_types.json", "w") as f:
+        json.dump(list(UNIT_TYPES), f)
+
+
+def load_wide(path, mmap=True):
+    """Load a WidePanel; with mmap the trips matrix is paged in only where it is sliced."""
+    path = Path(path)
+    with open(path / "unit_types.json") as f:
+        if tuple(json.load(f)) != UNIT_TYPES:
+            raise ValueError(f"{path} uses a different unit_type coding; rebuild it")
+    return WidePanel(
+        trips=np.load(path / "trips.npy", mmap_mode="r" if mmap else None),
+        hex_id=np.load(path / "hex_id.npy"),
+        time=np.load(path / "time.npy"),
+        unit_type=np.load(path / "unit_type.npy"),
+    )
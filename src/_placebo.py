@@ -0,0 +1,173 @@
+"""
+in-space placebo runner for ascm: refits every placebo unit against all other units
+on one shared units x weeks matrix, in a process pool, with per-placebo checkpoints
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src._ascm import fit_ascm, fit_placebos
+from src._fingerprint import fingerprint
+from src._instrument import peak_rss_mb, record
+
+
+# -- WORKERS --
+_Y = None
+_PRE = None
+_CACHE_DIR = None
+
+
+def _init_worker(Y, pre, cache_dir=None):
+    global _Y, _PRE, _CACHE_DIR
+    _Y, _PRE, _CACHE_DIR = Y, pre, cache_dir
+
+
+def _placebo_gaps(row):
+    """Gap trajectory for unit `row` treated as if it were the treated unit, with timings."""
+    start = time.perf_counter()
+    Y0 = np.delete(_Y, row, axis=0)
+    gaps = fit_ascm(Y0, _Y[row], _PRE, progfunc="ridge", cache_dir=_CACHE_DIR).att
+    return gaps, time.perf_counter() - start, peak_rss_mb()
+
+
+def _placebo_chunk(rows):
+    """Gap trajectories for a chunk of placebo rows via the shared-gram batched solver."""
+    start = time.perf_counter()
+    gaps = fit_placebos(_Y, rows, _PRE, cache_dir=_CACHE_DIR)
+    return gaps, time.perf_counter() - start, peak_rss_mb()
+
+
+# -- CHECKPOINTS --
+def _save(path, gaps):
+    # write then rename so an interrupted run never leaves a truncated checkpoint
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, gaps)
+    tmp.replace(path)
+
+
+# -- RUNNER --
+def run_placebos(
+    Y,
+    units,
+    placebo_units,
+    pre,
+    checkpoint_dir=None,
+    max_workers=None,
+    batched=True,
+    chunk_size=16,
+    cache_dir=None,
+):
+    """Fit every placebo unit and return {unit: gaps}.
+
+    Y: (n_units, T) outcomes of all units (treated and donors); units: (n_units,) ids.
+    Each placebo uses every other row of Y as its donor pool, like the R loop.
+    batched=True fits chunks of placebos with fit_placebos (shared gram, same results
+    as the one-fit-per-placebo path used when batched=False).
+    Finished placebos are saved under checkpoint_dir and skipped when the run resumes
+    with the same inputs, fit path and estimator code;
+    the ridge factorization of every placebo's donor set is cached under cache_dir.
+    Every fit (every chunk when batched) and the number of checkpointed placebos are
+    recorded in the run report.
+    """
+    Y = np.asarray(Y, dtype=float)
+    row_of = {unit: i for i, unit in enumerate(units)}
+
+    results = {}
+    ckpt = None
+    if checkpoint_dir is not None:
+        # keyed on the inputs, the fit path and the estimator code: checkpoints from
+        # another panel or an older estimator are never reused
+        ckpt = Path(checkpoint_dir) / fingerprint(Y, pre, units, batched=batched)
+        ckpt.mkdir(parents=True, exist_ok=True)
+        for unit in placebo_units:
+            path = ckpt / f"{unit}.npy"
+            if path.exists():
+                results[unit] = np.load(path)
+
+    todo = [unit for unit in placebo_units if unit not in results]
+    record("placebo_checkpoints", checkpointed=len(results), to_fit=len(todo))
+
+    if todo:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, initargs=(Y, pre, cache_dir)
+        ) as executor:
+            if batched:
+                chunks = [todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)]
+                rows = [np.array([row_of[unit] for unit in chunk]) for chunk in chunks]
+                jobs = zip(chunks, executor.map(_placebo_chunk, rows))
+            else:
+                rows = [row_of[unit] for unit in todo]
+                jobs = (
+                    ([unit], ([gaps], seconds, rss))
+                    for unit, (gaps, seconds, rss) in zip(
+                        todo, executor.map(_placebo_gaps, rows)
+                    )
+                )
+
+            for chunk, (chunk_gaps, seconds, rss) in jobs:
+                record(
+                    "placebo_fit",
+                    units=list(chunk),
+                    wall_s=round(seconds, 4),
+                    worker_peak_rss_mb=rss,
+                )
+                for unit, gaps in zip(chunk, chunk_gaps):
+                    results[unit] = gaps
+                    if ckpt is not None:
+                        _save(ckpt / f"{unit}.npy", gaps)
+
+    return {unit: results[unit] for unit in placebo_units}
+
+
+# -- SUMMARY --
+def placebo_outputs(placebo_gaps, treated_unit, treated_gaps, times, pre):
+    """Build the (trajectories, summary) tables written by 4_ascm.R.
+
+    Placebos whose post-period RMSPE exceeds 5x the treated pre-period RMSE are dropped.
+    """
+    post = ~pre
+    trajectories = [
+        pd.DataFrame({"unit": unit, "time": times, "gap": gaps, "type": "placebo"})
+        for unit, gaps in placebo_gaps.items()
+    ]
+    trajectories.append(
+        pd.DataFrame(
+            {"unit": treated_unit, "time": times, "gap": treated_gaps, "type": "treated"}
+        )
+    )
+    trajectories = pd.concat(trajectories, ignore_index=True)
+
+    units = np.array(list(placebo_gaps))
+    gaps = np.array(list(placebo_gaps.values())).reshape(len(units), len(times))
+    rmspe = np.sqrt(np.mean(gaps[:, post] ** 2, axis=1))
+
+    treated_pre_rmse = np.sqrt(np.mean(treated_gaps[pre] ** 2))
+    treated_post_rmse = np.sqrt(np.mean(treated_gaps[post] ** 2))
+
+    threshold = 5 * treated_pre_rmse
+    keep = rmspe <= threshold
+    trajectories = trajectories[
+        (trajectories["type"] == "treated") | trajectories["unit"].isin(units[keep])
+    ]
+
+    p_value = np.mean(rmspe[keep] >= treated_post_rmse) if keep.any() else np.nan
+    summary = pd.DataFrame(
+        {
+            "treated_pre_rmse": [treated_pre_rmse],
+            "treated_post_rmse": [treated_post_rmse],
+            "treated_rmspe_ratio": [treated_post_rmse / treated_pre_rmse],
+            "mean_placebo_post_rmse": [rmspe[keep].mean() if keep.any() else np.nan],
+            "p_value_post_rmse": [p_value],
+            "p_value_rmspe_ratio": [p_value],
+            "n_placebos": [keep.sum()],
+            "n_placebos_excluded": [(~keep).sum()],
+            "pre_rmspe_threshold": [threshold],
+        }
+    )
+    return trajectories, summary
@@ -0,0 +1,157 @@
+"""
+model output tables in the schemas written by 4_ascm.R (timeseries, att, weights and
+summary per model, placebo trajectories and summary), kept in a typed parquet store:
+one dataset per table under models/results/, partitioned by model and run id
+(models/results/<table>/model=<model>/run_id=<run id>/part-0.parquet); runs that wrote
+all their tables are listed in models/results/_runs.json, in the order they finished,
+and readers only see those
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+RESULTS_DIR = "results"  # under the models directory
+MANIFEST = "_runs.json"  # completed runs, oldest first (skipped by parquet readers)
+
+
+def model_tables(fit, times, y1, donor_ids, treated_hex, pre, inference=None):
+    """{table name: DataFrame} for one SynthFit of treated outcomes y1 on donor_ids.
+
+    inference (att_inference() output) fills std_error and adds the lower_bound,
+    upper_bound and p_value columns to the att table; without it std_error is empty,
+    as with summary(inf = FALSE) in 4_ascm.R.
+    """
+    treated_pre_mean = y1[pre].mean()
+    avg_att = fit.att[~pre].mean()
+    att = pd.DataFrame({"time": times, "att": fit.att, "std_error": np.nan})
+    if inference is not None:
+        att = att.assign(**{col: inference[col].values for col in inference.columns})
+    return {
+        "timeseries": pd.DataFrame(
+            {"time": times, "observed": y1, "synthetic": fit.synthetic}
+        ),
+        "att": att,
+        "weights": pd.DataFrame({"hex_id": donor_ids, "weight": fit.weights}),
+        "summary": pd.DataFrame(
+            {
+                "treated_hex": [treated_hex],
+                "n_donors": [len(donor_ids)],
+                "n_pre_periods": [pre.sum()],
+                "n_post_periods": [(~pre).sum()],
+                "pre_rmse": [np.sqrt(np.mean(fit.att[pre] ** 2))],
+                "treated_pre_mean": [treated_pre_mean],
+                "avg_att": [avg_att],
+                "att_percent": [avg_att / treated_pre_mean * 100],
+            }
+        ),
+    }
+
+
+# -- STORE --
+def new_run_id():
+    """Run id of a run starting now (any other string works as well)."""
+    return datetime.now().strftime("%Y%m%dT%H%M%S")
+
+
+def _manifest_path(output_dir):
+    return Path(output_dir) / RESULTS_DIR / MANIFEST
+
+
+def completed_runs(input_dir):
+    """[{run_id, models, completed}] of the completed runs, in the order they finished."""
+    path = _manifest_path(input_dir)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(output_dir, runs):
+    path = _manifest_path(output_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(runs, f, indent=2)
+    tmp.replace(path)
+
+
+def _part(output_dir, table, model_name, run_id):
+    return (
+        Path(output_dir) / RESULTS_DIR / table / f"model={model_name}" / f"run_id={run_id}"
+    ) / "part-0.parquet"
+
+
+def write_tables(tables, output_dir, model_name, run_id):
+    """Write {table name: DataFrame} to the results store under output_dir.
+
+    A rerun with the same run id replaces that run's tables; the run counts as
+    incomplete again until complete_run().
+    """
+    runs = completed_runs(output_dir)
+    if any(run["run_id"] == run_id for run in runs):
+        _write_manifest(output_dir, [run for run in runs if run["run_id"] != run_id])
+    for name, table in tables.items():
+        path = _part(output_dir, name, model_name, run_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table.to_parquet(path, index=False)
+
+
+def complete_run(output_dir, run_id, models, keep=None):
+    """Mark a run whose tables for `models` are all written as the latest completed run.
+
+    keep = n deletes every other run (completed or not, e.g. crashed) but the n most
+    recently completed; only one run may write to a store at a time then.
+    """
+    runs = [run for run in completed_runs(output_dir) if run["run_id"] != run_id]
+    runs.append(
+        {
+            "run_id": run_id,
+            "models": sorted(models),
+            "completed": datetime.now().isoformat(timespec="seconds"),
+        }
+    )
+    if keep is not None:
+        runs = runs[-keep:]
+    _write_manifest(output_dir, runs)
+    if keep is not None:
+        kept = {f"run_id={run['run_id']}" for run in runs}
+        for part in Path(output_dir, RESULTS_DIR).glob("*/model=*/run_id=*"):
+            if part.name not in kept:
+                shutil.rmtree(part)
+
+
+def latest_run(input_dir, model_name):
+    """Run id of the last completed run of this model (None if there is none).
+
+    Every table of a model is read from this one run, so a crashed run never mixes
+    its tables with an older run's.
+    """
+    runs = [run for run in completed_runs(input_dir) if model_name in run["models"]]
+    return runs[-1]["run_id"] if runs else None
+
+
+def read_table(input_dir, table, model_name, columns=None, run_id=None):
+    """One table of one model and run (default: the latest completed) from the results store.
+
+    Only `columns` are read; requested columns the table does not have (such as the
+    inference bands) are skipped. Without a stored run, falls back to the csv
+    written by 4_ascm.R, <input_dir>/<model_name>_<table>.csv.
+    """
+    run_id = run_id or latest_run(input_dir, model_name)
+    if run_id is None:
+        path = Path(input_dir) / f"{model_name}_{table}.csv"
+        header = pd.read_csv(path, nrows=0).columns
+        return pd.read_csv(path, usecols=[c for c in columns if c in header] if columns else None)
+
+    path = _part(input_dir, table, model_name, run_id)
+    if columns is not None:
+        names = pq.read_schema(path).names
+        columns = [c for c in columns if c in names]
+    return pd.read_parquet(path, columns=columns)
@@ -0,0 +1,131 @@
+"""
+ridge augmentation for ascm from one factorization of the donor pre-period matrix: the
+lambda path, leave-one-period-out cv for every lambda and the ridge correction all reuse
+the same thin svd, which can be cached on disk per donor set (content hash)
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+
+# -- FACTORIZATION --
+@dataclass
+class RidgeFactor:
+    means: np.ndarray  # (T0,) donor mean of each pre-period
+    s: np.ndarray  # (r,) singular values of the centered donor matrix X_c
+    Vt: np.ndarray  # (r, T0) right singular vectors
+    U: np.ndarray = None  # (n_donors, r) left singular vectors (None from a gram matrix)
+
+
+def _key(*arrays):
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        h.update(str(array.shape).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()[:24]
+
+
+def _cached(cache_dir, key, compute):
+    """RidgeFactor from cache_dir/<key>.npz, computed and saved on a miss."""
+    if cache_dir is None:
+        return compute()
+    path = Path(cache_dir) / f"{key}.npz"
+    if path.exists():
+        with np.load(path) as f:
+            return RidgeFactor(**{name: f[name] for name in f.files})
+    factor = compute()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write then rename, so parallel placebo workers never read a partial file
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **{k: v for k, v in vars(factor).items() if v is not None})
+    tmp.replace(path)
+    return factor
+
+
+def factorize(X0, cache_dir=None):
+    """Thin svd of the donor pre-period matrix X0 (n_donors, T0), centered on donor means."""
+
+    def compute():
+        means = X0.mean(axis=0)
+        U, s, Vt = np.linalg.svd(X0 - means, full_matrices=False)
+        return RidgeFactor(means=means, s=s, Vt=Vt, U=U)
+
+    return _cached(cache_dir, _key(X0), compute)
+
+
+def factorize_gram(G, means, cache_dir=None):
+    """Same factor from the centered period gram G = X_c'X_c (T0, T0), without U."""
+
+    def compute():
+        evals, evecs = np.linalg.eigh(G)
+        return RidgeFactor(means=means, s=np.sqrt(np.clip(evals, 0, None)), Vt=evecs.T)
+
+    return _cached(cache_dir, _key(G, means), compute)
+
+
+# -- LAMBDA PATH AND CV --
+def lambda_path(factor, lambda_min_ratio=1e-8, n_lambda=20):
+    """augsynth's default grid: sigma_max(X_c)^2 down to sigma_max(X_c)^2 * lambda_min_ratio."""
+    lambda_max = factor.s.max() ** 2
+    scaler = lambda_min_ratio ** (1 / n_lambda)
+    return lambda_max * scaler ** np.arange(n_lambda + 1)
+
+
+def loo_predictions(factor, resid, lambdas):
+    """Ridge prediction of each held-out period from the others, for every lambda.
+
+    resid: (folds, T0) residuals of fold i's scm fit, with resid[i, i] (the held-out
+    period) ignored. Fold i's correction X_i (X_i'X_i + lambda I)^-1 resid_i, evaluated at
+    the held-out period, equals -(M resid_i)_i / M_ii with M = (X_c'X_c + lambda I)^-1 over
+    all periods (the inverse of a principal submatrix), so every fold and lambda comes from
+    the one factorization. Returns (folds, n_lambda).
+    """
+    folds, T0 = resid.shape
+    V = factor.Vt.T
+    R = resid.copy()
+    R[np.arange(folds), np.arange(folds)] = 0.0
+    V_i = V[:folds]
+    P = V_i * (R @ V)  # (folds, r)
+    inv = 1 / (factor.s[:, None] ** 2 + np.asarray(lambdas)[None, :])
+    num = P @ inv
+    den = V_i**2 @ inv
+    if len(factor.s) < T0:
+        # fewer donors than periods: M also has (I - VV') / lambda on the null space
+        num -= P.sum(axis=1, keepdims=True) / lambdas
+        den += (1 - (V_i**2).sum(axis=1, keepdims=True)) / lambdas
+    return -num / den
+
+
+def choose_lambda(errors, lambdas, min_1se=True):
+    """Lambda with the least mean cv error, or the largest within one se of it (min_1se)."""
+    folds = errors.shape[0]
+    mean_err = errors.mean(axis=0)
+    se_err = errors.std(axis=0, ddof=1) / np.sqrt(folds)
+    best = np.argmin(mean_err)
+    if not min_1se:
+        return lambdas[best], mean_err, se_err
+    return np.max(lambdas[mean_err <= mean_err[best] + se_err[best]]), mean_err, se_err
+
+
+# -- CORRECTION --
+def ridge_solve(factor, resid, lambdas):
+    """(X_c'X_c + lambda I)^-1 resid for each lambda: (T0, n_lambda), in period space."""
+    lambdas = np.asarray(lambdas)
+    proj = factor.Vt @ resid
+    inv = 1 / (factor.s[:, None] ** 2 + lambdas[None, :])
+    coef = factor.Vt.T @ (inv * proj[:, None])
+    if len(factor.s) < len(resid):
+        coef += (resid - factor.Vt.T @ proj)[:, None] / lambdas
+    return coef
+
+
+def ridge_adjustment(factor, resid, lambdas):
+    """Ridge weight corrections X_c (X_c'X_c + lambda I)^-1 resid: (n_donors, n_lambda)."""
+    shrink = factor.s[:, None] / (factor.s[:, None] ** 2 + np.asarray(lambdas)[None, :])
+    return factor.U @ (shrink * (factor.Vt @ resid)[:, None])
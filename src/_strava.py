@@ -0,0 +1,214 @@
+"""
+duckdb helpers for the raw strava metro edge-hour data
+"""
+
+import json
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+
+
+STRAVA_DB = "data/strava/strava.duckdb"
+STRAVA_PARQUET = "data/strava/hourly"
+STRAVA_MAP = "data/strava/strava_map.shp"
+EDGE_DAILY = "data/strava/edge_daily.parquet"
+
+
+# -- PARTITIONED PARQUET COPY --
+# written last into the copy: the raw table's (max hour, rows) it was exported from
+COPY_STATE = "_source.json"
+
+
+def source_state(conn):
+    """(max hour, rows) of the raw `data` table, to tell whether a parquet copy is current."""
+    max_hour, rows = conn.execute("SELECT MAX(hour), COUNT(*) FROM data").fetchone()
+    return {"max_hour": max_hour, "rows": rows}
+
+
+def copy_state(parquet_dir=STRAVA_PARQUET):
+    """Source state recorded by a finished conversion (None without a complete copy)."""
+    path = Path(parquet_dir) / COPY_STATE
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def _export(conn, out_dir, where=""):
+    # only the columns the aggregations read; `hour` is parsed once into a typed ts
+    conn.execute(f"""
+        COPY (
+            SELECT edge_uid, total_trip_count, ts, CAST(ts AS DATE) AS date
+            FROM (
+                SELECT edge_uid, total_trip_count, STRPTIME(hour, '%Y-%m-%dT%H') AS ts
+                FROM data
+                {where}
+            )
+        ) TO '{out_dir}' (FORMAT PARQUET, PARTITION_BY (date))
+    """)
+
+
+def convert_to_parquet(conn, out_dir=STRAVA_PARQUET):
+    """Export the raw `data` table to parquet partitioned by date.
+
+    Later queries filter on `date` and only read the matching partitions. The copy is
+    written to a temporary directory and renamed into place with its source state, so
+    an interrupted export is never read as complete.
+    """
+    out_dir = Path(out_dir)
+    tmp = out_dir.with_name(f"{out_dir.name}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    state = source_state(conn)
+    _export(conn, tmp)
+    (tmp / COPY_STATE).write_text(json.dumps(state))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp.rename(out_dir)
+
+
+def sync_parquet(conn, parquet_dir=STRAVA_PARQUET):
+    """Bring the parquet copy up to date with the raw table; returns what was done.
+
+    Rows appended to the raw table since the copy's max hour are exported on their
+    own and added to its partitions; any other change to the table (rows edited or
+    removed, or no finished copy) reconverts everything.
+    """
+    state, source = copy_state(parquet_dir), source_state(conn)
+    if state == source:
+        return "current"
+    watermark = state["max_hour"] if state else None
+    if state is None or source["max_hour"] <= watermark:
+        convert_to_parquet(conn, parquet_dir)
+        return "converted"
+    where = f"WHERE hour > '{watermark}'"
+    (new_rows,) = conn.execute(f"SELECT COUNT(*) FROM data {where}").fetchone()
+    if state["rows"] + new_rows != source["rows"]:
+        convert_to_parquet(conn, parquet_dir)
+        return "converted"
+
+    # new hours go to a temporary directory, then into the partitions under a name
+    # tied to the watermark: leftovers of an interrupted append are dropped on retry
+    parquet_dir = Path(parquet_dir)
+    prefix = f"after_{watermark}_"
+    for leftover in parquet_dir.glob(f"date=*/{prefix}*"):
+        leftover.unlink()
+    tmp = parquet_dir.with_name(f"{parquet_dir.name}.append")
+    shutil.rmtree(tmp, ignore_errors=True)
+    _export(conn, tmp, where)
+    for path in tmp.glob("date=*/*.parquet"):
+        partition = parquet_dir / path.parent.name
+        partition.mkdir(exist_ok=True)
+        path.rename(partition / f"{prefix}{path.name}")
+    shutil.rmtree(tmp)
+    (parquet_dir / COPY_STATE).write_text(json.dumps(source))
+    return f"appended {new_rows} rows"
+
+
+def hourly_source(conn, partitioned=False, parquet_dir=STRAVA_PARQUET):
+    """SQL relation over edge-hour rows with typed `ts` and `date` columns.
+
+    partitioned=True reads the parquet copy (see sync_parquet), and raises if it is
+    missing or was exported from an older state of the raw table; otherwise `hour`
+    is parsed once per row from the raw table.
+    """
+    if partitioned:
+        if copy_state(parquet_dir) != source_state(conn):
+            raise RuntimeError(
+                f"{parquet_dir} is missing or older than the raw strava table; "
+                "run sync_parquet first"
+            )
+        return f"read_parquet('{parquet_dir}/*/*.parquet', hive_partitioning = true)"
+    return """(
+        SELECT *, CAST(ts AS DATE) AS date
+        FROM (
+            SELECT edge_uid, total_trip_count, STRPTIME(hour, '%Y-%m-%dT%H') AS ts
+            FROM data
+        )
+    )"""
+
+
+def weekly_hex_counts(conn, source, treatment_date, start_date, end_date):
+    """Aggregate edge-hour trips straight to (hex_id, time) weeks centered on treatment_date.
+
+    Expects a `hex_edge_map` (hex_id, edge_uid) relation registered on conn.
+    end_date=None aggregates everything from start_date onward.
+    """
+    end_filter = f"AND s.date < DATE '{end_date}'" if end_date is not None else ""
+    return conn.execute(f"""
+        SELECT
+            CAST(m.hex_id AS INTEGER) AS hex_id,
+            CAST(FLOOR(DATE_DIFF('day', DATE '{treatment_date}', s.date) / 7) AS INTEGER) AS time,
+            CAST(SUM(s.total_trip_count) AS FLOAT) AS trips
+        FROM {source} s
+        JOIN hex_edge_map m ON s.edge_uid = m.edge_uid
+        WHERE s.date >= DATE '{start_date}'
+          {end_filter}
+        GROUP BY ALL
+    """).df()
+
+
+def daily_hex_counts(conn, source, start_date, end_date):
+    """Aggregate edge-hour trips to (hex_id, date) days, the grain every panel is binned from.
+
+    Expects a `hex_edge_map` (hex_id, edge_uid) relation registered on conn.
+    end_date=None aggregates everything from start_date onward.
+    """
+    end_filter = f"AND s.date < DATE '{end_date}'" if end_date is not None else ""
+    return conn.execute(f"""
+        SELECT
+            CAST(m.hex_id AS INTEGER) AS hex_id,
+            CAST(s.date AS DATE) AS date,
+            CAST(SUM(s.total_trip_count) AS FLOAT) AS trips
+        FROM {source} s
+        JOIN hex_edge_map m ON s.edge_uid = m.edge_uid
+        WHERE s.date >= DATE '{start_date}'
+          {end_filter}
+        GROUP BY ALL
+        ORDER BY hex_id, date
+    """).df()
+
+
+def edge_centroids(path=STRAVA_MAP, crs="EPSG:3857"):
+    """(edge_uid, x, y) arrays of the network edge centroids in crs."""
+    gdf = gpd.read_file(path)
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    centroids = gdf.to_crs(crs).geometry.centroid
+    return gdf["edgeUID"].values, centroids.x.values, centroids.y.values
+
+
+def export_edge_daily(conn, source, start_date, end_date, out_path=EDGE_DAILY):
+    """One scan of the edge-hour data into (edge_uid, date, trips) days written to parquet.
+
+    Any number of hex grids can then be aggregated from this file (see
+    hex_counts_from_edges) without touching the hourly data again.
+    """
+    end_filter = f"AND date < DATE '{end_date}'" if end_date is not None else ""
+    conn.execute(f"""
+        COPY (
+            SELECT
+                edge_uid,
+                CAST(date AS DATE) AS date,
+                CAST(SUM(total_trip_count) AS FLOAT) AS trips
+            FROM {source}
+            WHERE date >= DATE '{start_date}'
+              {end_filter}
+            GROUP BY ALL
+        ) TO '{out_path}' (FORMAT PARQUET)
+    """)
+
+
+def hex_counts_from_edges(conn, edge_map="hex_edge_map", edge_daily=EDGE_DAILY):
+    """Aggregate the edge-day parquet to (hex_id, date, trips) in one read.
+
+    edge_map is a relation registered on conn with edge_uid, hex_id and optionally
+    more key columns (e.g. radius), which are kept in the result; one query then
+    covers every grid in the map.
+    """
+    return conn.execute(f"""
+        SELECT
+            m.* EXCLUDE (edge_uid) REPLACE (CAST(m.hex_id AS INTEGER) AS hex_id),
+            e.date,
+            CAST(SUM(e.trips) AS FLOAT) AS trips
+        FROM read_parquet('{edge_daily}') e
+        JOIN {edge_map} m USING (edge_uid)
+        GROUP BY ALL
+        ORDER BY ALL
+    """).df()
@@ -0,0 +1,187 @@
+"""
+basemap tiles with a persistent on-disk cache (size-capped, least recently used
+tiles evicted first), optional local mbtiles source and an offline mode;
+stitched basemaps are also kept in memory for repeated renders of one extent
+"""
+
+import io
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import mercantile as mt
+import numpy as np
+import requests
+from contextily import add_attribution
+from PIL import Image
+
+
+USER_AGENT = "berlin-scm basemap cache"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+TILE_SIZE = 256
+
+# stitched basemaps by (provider, zoom, tile range)
+_IMAGES = {}
+
+
+class TileCache:
+    def __init__(
+        self,
+        source,
+        cache_dir="data/tile_cache",
+        max_mb=200,
+        mbtiles=None,
+        offline=False,
+        max_retries=3,
+        backoff=1.0,
+        timeout=30,
+    ):
+        self.source = source
+        self.cache_dir = Path(cache_dir) / source.name if cache_dir is not None else None
+        self.max_bytes = int(max_mb * 1024**2)
+        self.mbtiles = Path(mbtiles) if mbtiles is not None else None
+        self.offline = offline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._session = None
+        self._cache_bytes = None
+
+    # -- SOURCES --
+    def _from_mbtiles(self, z, x, y):
+        if self.mbtiles is None or not self.mbtiles.exists():
+            return None
+        # connect per read: cheap, and safe when the cache is shared with forked workers
+        with closing(sqlite3.connect(f"file:{self.mbtiles}?mode=ro", uri=True)) as conn:
+            # mbtiles rows follow the tms scheme (y axis flipped)
+            row = conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? "
+                "AND tile_row = ?",
+                (z, x, (1 << z) - 1 - y),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _tile_path(self, z, x, y):
+        return self.cache_dir / str(z) / str(x) / f"{y}.png"
+
+    def _from_cache(self, z, x, y):
+        if self.cache_dir is None:
+            return None
+        path = self._tile_path(z, x, y)
+        if not path.exists():
+            return None
+        # mtime marks recent use, which drives eviction
+        os.utime(path)
+        return path.read_bytes()
+
+    def _download(self, z, x, y):
+        if self.offline:
+            raise RuntimeError(
+                f"tile {z}/{x}/{y} of {self.source.name} is neither cached nor in the "
+                "mbtiles file, and offline mode is on"
+            )
+        if self._session is None:
+            self._session = requests.Session()
+        url = self.source.build_url(x=x, y=y, z=z)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._session.get(
+                    url, headers={"user-agent": USER_AGENT}, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.content
+            time.sleep(self.backoff * 2**attempt)
+
+    # -- CACHE --
+    def _store(self, z, x, y, data):
+        if self.cache_dir is None:
+            return
+        path = self._tile_path(z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so an interrupted run never leaves a truncated tile
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+        if self._cache_bytes is None:
+            self._cache_bytes = sum(p.stat().st_size for p in self.cache_dir.rglob("*.png"))
+        else:
+            self._cache_bytes += len(data)
+        if self._cache_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used tiles until the cache is under 90% of max_mb."""
+        tiles = sorted(
+            ((p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_dir.rglob("*.png")),
+            key=lambda t: t[0],
+        )
+        total = sum(size for _, size, _ in tiles)
+        for _, size, path in tiles:
+            if total <= 0.9 * self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._cache_bytes = total
+
+    def tile(self, z, x, y):
+        """Raw png bytes of one tile: mbtiles, then disk cache, then the network."""
+        data = self._from_mbtiles(z, x, y)
+        if data is None:
+            data = self._from_cache(z, x, y)
+        if data is None:
+            data = self._download(z, x, y)
+            self._store(z, x, y, data)
+        return data
+
+    def seed(self, bounds, zoom):
+        """Fetch every tile covering (minx, miny, maxx, maxy) in EPSG:3857 into the cache."""
+        for t in _tiles_for(bounds, zoom):
+            self.tile(t.z, t.x, t.y)
+
+    # -- BASEMAP --
+    def image(self, bounds, zoom):
+        """Stitched RGBA image and (left, right, bottom, top) extent in EPSG:3857."""
+        tiles = _tiles_for(bounds, zoom)
+        xs = sorted({t.x for t in tiles})
+        ys = sorted({t.y for t in tiles})
+        key = (self.source.name, zoom, xs[0], xs[-1], ys[0], ys[-1])
+        if key in _IMAGES:
+            return _IMAGES[key]
+
+        image = np.zeros((len(ys) * TILE_SIZE, len(xs) * TILE_SIZE, 4), dtype=np.uint8)
+        for t in tiles:
+            with Image.open(io.BytesIO(self.tile(t.z, t.x, t.y))) as tile:
+                array = np.asarray(tile.convert("RGBA").resize((TILE_SIZE, TILE_SIZE)))
+            row, col = ys.index(t.y) * TILE_SIZE, xs.index(t.x) * TILE_SIZE
+            image[row : row + TILE_SIZE, col : col + TILE_SIZE] = array
+
+        top_left = mt.xy_bounds(xs[0], ys[0], zoom)
+        bottom_right = mt.xy_bounds(xs[-1], ys[-1], zoom)
+        extent = (top_left.left, bottom_right.right, bottom_right.bottom, top_left.top)
+        _IMAGES[key] = image, extent
+        return image, extent
+
+    def add_basemap(self, ax, zoom):
+        """Draw the basemap under the current axis limits (like contextily.add_basemap)."""
+        xmin, xmax, ymin, ymax = ax.axis()
+        image, extent = self.image((xmin, ymin, xmax, ymax), zoom)
+        ax.imshow(image, extent=extent, interpolation="bilinear", aspect=ax.get_aspect())
+        ax.axis((xmin, xmax, ymin, ymax))
+        attribution = self.source.get("attribution")
+        if attribution:
+            add_attribution(ax, attribution)
+
+
+def _tiles_for(bounds, zoom):
+    minx, miny, maxx, maxy = bounds
+    west, south = mt.lnglat(minx, miny)
+    east, north = mt.lnglat(maxx, maxy)
+    return list(mt.tiles(west, south, east, north, [zoom]))
@@ -0,0 +1,466 @@
+"""
+runs the analysis pipeline as a dag: each stage declares its inputs and outputs,
+stages whose inputs, parameters and code are unchanged are skipped, and
+independent stages run in parallel, except stages that fill every cpu with a process
+pool, which run alone; batch and robustness only run when named on the command line;
+every run updates .pipeline/run_report.json (per-stage wall time, peak rss, sections
+recorded by the scripts, output sizes; skipped stages keep the metrics of their last run)
+usage: python src/pipeline.py [stage ...] [--force] [--dry-run] [--jobs N]
+                              [--profile {cprofile,py-spy}]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+# -- PARAMETERS --
+ROOT = Path(__file__).resolve().parent.parent
+STATE_PATH = ROOT / ".pipeline" / "state.json"
+REPORT_PATH = ROOT / ".pipeline" / "run_report.json"
+STAGE_REPORT_DIR = ROOT / ".pipeline" / "reports"  # one per stage, written by src/_instrument.py
+PROFILE_DIR = ROOT / ".pipeline" / "profiles"
+
+# datasets of the results store (src/_results.py), one per table, partitioned by model and run
+MODEL_TABLES = [f"models/results/{table}" for table in ("timeseries", "att", "weights", "summary")]
+PLACEBO_TABLES = ["models/results/placebo_trajectories", "models/results/placebo_summary"]
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: list  # files or glob patterns that must exist for the stage to run
+    outputs: list
+    optional: list = field(default_factory=list)  # hashed when present, not required
+    shipped: bool = False  # outputs are distributed in data/: adopt them on the first run
+    exclusive: bool = False  # uses a process pool over all cpus: never shares the machine
+    default: bool = True  # part of a run without named stages
+
+
+STAGES = [
+    Stage(
+        "hexagons",
+        "src/1_hexagons.py",
+        inputs=["data/strava/strava_map.*"],
+        outputs=["data/berlin_hexagons.parquet", "data/berlin_hexagons.json"],
+        shipped=True,
+    ),
+    Stage(
+        "features",
+        "src/2_features.py",
+        inputs=["data/berlin_hexagons.parquet"],
+        outputs=["data/hex_osm_features.csv"],
+        optional=["data/osm/berlin.osm.pbf"],
+        shipped=True,
+    ),
+    Stage(
+        "panel",
+        "src/3_panel.py",
+        inputs=[
+            "data/berlin_hexagons.parquet",
+            "data/berlin_hexagons.json",
+            "data/hex_osm_features.csv",
+            "data/strava/strava.duckdb",
+            "data/strava/strava_map.*",
+        ],
+        outputs=["data/panel_weekly.parquet", "data/panel_weekly_wide/*"],
+        shipped=True,
+    ),
+    Stage(
+        "ascm",
+        "src/4_ascm.py",
+        inputs=["data/panel_weekly_wide/*"],
+        outputs=MODEL_TABLES + PLACEBO_TABLES,
+        exclusive=True,
+    ),
+    Stage(
+        "batch",
+        "src/4_batch.py",
+        inputs=[
+            "data/interventions.csv",
+            "data/berlin_hexagons.parquet",
+            "data/panel_weekly_wide/*",
+        ],
+        outputs=["models/batch/summary.csv"],
+        exclusive=True,
+        default=False,
+    ),
+    Stage(
+        "robustness",
+        "src/4_robustness.py",
+        inputs=["data/panel_weekly_wide/*"],
+        outputs=["models/robustness.parquet"],
+        exclusive=True,
+        default=False,
+    ),
+    Stage(
+        "report",
+        "src/report.py",
+        inputs=[
+            "models/results/timeseries",
+            "models/results/att",
+            "models/results/weights",
+            *PLACEBO_TABLES,
+            "data/berlin_hexagons.parquet",
+            "data/hex_osm_features.csv",
+        ],
+        outputs=[
+            "output/figs/scm_combined.png",
+            "output/figs/ascm_combined.png",
+            "output/figs/ascm_placebo.png",
+            "output/figs/scm_map.png",
+            "output/figs/ascm_map.png",
+            "output/tables/donor_characteristics.tex",
+        ],
+        exclusive=True,
+    ),
+]
+
+
+# -- HASHING --
+_IMPORT = re.compile(
+    r"^\s*from src\.(\w+) import|^\s*import src\.(\w+)|import_module\(\"src\.(\w+)\"\)",
+    re.MULTILINE,
+)
+
+
+def _expand(patterns):
+    """Resolve file paths / glob patterns relative to the project root (sorted)."""
+    paths = []
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["):
+            paths.extend(sorted(ROOT.glob(pattern)))
+        else:
+            paths.append(ROOT / pattern)
+    return paths
+
+
+def _missing(patterns):
+    """Patterns that match no existing file."""
+    return [p for p in patterns if not any(path.exists() for path in _expand([p]))]
+
+
+def _code_files(script):
+    """The script plus every src module it imports, transitively."""
+    seen = []
+    todo = [ROOT / script]
+    while todo:
+        path = todo.pop()
+        if path in seen or not path.exists():
+            continue
+        seen.append(path)
+        for match in _IMPORT.finditer(path.read_text(encoding="utf-8")):
+            todo.append(ROOT / "src" / f"{next(filter(None, match.groups()))}.py")
+    return sorted(seen)
+
+
+class FileHasher:
+    """Content hashes memoized on (size, mtime), so unchanged files are never re-read."""
+
+    def __init__(self, memo):
+        self.memo = memo
+
+    def __call__(self, path):
+        if not path.exists():
+            return "missing"
+        if path.is_dir():
+            return hashlib.sha256(
+                "".join(self(p) for p in sorted(path.rglob("*")) if p.is_file()).encode()
+            ).hexdigest()
+        stat = path.stat()
+        key = str(path.relative_to(ROOT))
+        cached = self.memo.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.memo[key] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+
+def stage_hash(stage, hasher):
+    """Digest of the stage's code (incl. its PARAMETERS block) and all input contents."""
+    paths = _code_files(stage.script) + _expand(stage.inputs) + _expand(stage.optional)
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(f"{path.relative_to(ROOT)}:{hasher(path)}\n".encode())
+    return h.hexdigest()
+
+
+# -- STATE --
+def load_state():
+    if not STATE_PATH.exists():
+        return {"stages": {}, "files": {}}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    tmp.replace(path)
+
+
+def save_state(state):
+    _write_json(STATE_PATH, state)
+
+
+# -- RUN REPORT --
+def _output_sizes(stage):
+    """{output path: bytes} of every existing output file of a stage."""
+    return {
+        str(path.relative_to(ROOT)): path.stat().st_size
+        for path in _expand(stage.outputs)
+        if path.is_file()
+    }
+
+
+def stage_report(stage, result, seconds, profile_path=None):
+    """Run report entry of a finished stage, merged with what its script recorded."""
+    entry = {
+        "status": "done" if result.returncode == 0 else "failed",
+        "ran_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "wall_s": round(seconds, 3),
+        "outputs": _output_sizes(stage),
+    }
+    script_report = STAGE_REPORT_DIR / f"{stage.name}.json"
+    if script_report.exists():
+        with open(script_report) as f:
+            recorded = json.load(f)
+        entry.update({k: v for k, v in recorded.items() if k not in ("script", "wall_s")})
+    if profile_path is not None:
+        entry["profile"] = str(profile_path.relative_to(ROOT))
+    return entry
+
+
+def load_report():
+    if not REPORT_PATH.exists():
+        return {"stages": {}}
+    with open(REPORT_PATH) as f:
+        return json.load(f)
+
+
+def carried_report(previous, name, status):
+    """Entry of a stage that did not run: its last run's metrics under the new status."""
+    return {**previous["stages"].get(name, {}), "status": status}
+
+
+# -- SCHEDULING --
+def dependencies(stages):
+    """{stage name: names of the stages producing any of its inputs}."""
+    producer = {out: s.name for s in stages for out in s.outputs}
+    return {
+        s.name: {producer[p] for p in s.inputs + s.optional if p in producer} - {s.name}
+        for s in stages
+    }
+
+
+def select(stages, targets):
+    """Requested stages (default: the default ones) plus everything upstream of them."""
+    if not targets:
+        return [s for s in stages if s.default]
+    by_name = {s.name: s for s in stages}
+    unknown = set(targets) - set(by_name)
+    if unknown:
+        raise ValueError(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    deps = dependencies(stages)
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in wanted]
+
+
+def run_script(stage, profile=None):
+    """Run a stage's script; profile = "cprofile" or "py-spy" also writes a profile."""
+    env = dict(os.environ, MPLBACKEND="Agg")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    script_report = STAGE_REPORT_DIR / f"{stage.name}.json"
+    script_report.unlink(missing_ok=True)
+    env["RUN_REPORT"] = str(script_report)
+
+    command = [sys.executable, stage.script]
+    profile_path = None
+    if profile is not None:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if profile == "cprofile":
+        # inspect with python -m pstats or snakeviz
+        profile_path = PROFILE_DIR / f"{stage.name}.prof"
+        command = [sys.executable, "-m", "cProfile", "-o", str(profile_path), stage.script]
+    elif profile == "py-spy":
+        # sampling flame graph, including the process pool workers
+        profile_path = PROFILE_DIR / f"{stage.name}.svg"
+        command = ["py-spy", "record", "--subprocesses", "-o", str(profile_path), "--"] + command
+
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    return result, time.perf_counter() - start, profile_path
+
+
+def run(targets=(), force=False, dry_run=False, jobs=None, profile=None):
+    stages = select(STAGES, targets)
+    deps = dependencies(stages)
+    producer = {out: s.name for s in stages for out in s.outputs}
+    state = load_state()
+    hasher = FileHasher(state["files"])
+
+    pending = {s.name: s for s in stages}
+    # --force applies to the requested stages, not to everything upstream of them
+    forced = set(targets or pending) if force else set()
+    done = set()
+    due = []  # (stage, digest) to run, waiting while an exclusive stage holds the machine
+    rerun = set()  # stages run (or, in a dry run, due to run) in this invocation
+    failed = []
+    previous = load_report()
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "targets": list(targets),
+        "profile": profile,
+        # stages outside this run (e.g. batch) keep their entries
+        "stages": {
+            name: entry
+            for name, entry in previous["stages"].items()
+            if name in {s.name for s in STAGES}
+        },
+    }
+
+    def ready():
+        return [s for name, s in pending.items() if deps[name] <= done]
+
+    def decide(stage):
+        """Return ("skip" | "run" | "unavailable", digest) for a stage whose upstream is done."""
+        missing = _missing(stage.inputs)
+        if dry_run:
+            # outputs of stages that would run first do not exist yet
+            missing = [p for p in missing if producer.get(p) not in rerun]
+        if missing:
+            return "unavailable", None
+        if dry_run and deps[stage.name] & rerun:
+            return "run", None
+        digest = stage_hash(stage, hasher)
+        if stage.shipped and stage.name not in state["stages"] and not _missing(stage.outputs):
+            state["stages"][stage.name] = digest
+            print(f"[{stage.name}] adopting existing outputs")
+        up_to_date = state["stages"].get(stage.name) == digest and not _missing(
+            stage.outputs
+        )
+        return ("skip" if up_to_date and stage.name not in forced else "run"), digest
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        running = {}
+        while pending or running or due:
+            for stage in ready():
+                del pending[stage.name]
+                action, digest = decide(stage)
+                if action == "unavailable":
+                    # e.g. raw strava data, which is not distributed with the repo
+                    if _missing(stage.outputs):
+                        failed.append(stage.name)
+                        report["stages"][stage.name] = {"status": "missing inputs"}
+                        print(f"[{stage.name}] missing {', '.join(_missing(stage.inputs))}")
+                        continue
+                    print(f"[{stage.name}] inputs not available, using existing outputs")
+                    report["stages"][stage.name] = carried_report(
+                        previous, stage.name, "inputs not available"
+                    )
+                    done.add(stage.name)
+                elif action == "skip":
+                    print(f"[{stage.name}] up to date")
+                    report["stages"][stage.name] = carried_report(
+                        previous, stage.name, "up to date"
+                    )
+                    done.add(stage.name)
+                elif dry_run:
+                    print(f"[{stage.name}] would run {stage.script}")
+                    done.add(stage.name)
+                    rerun.add(stage.name)
+                else:
+                    due.append((stage, digest))
+
+            for stage, digest in list(due):
+                busy = [s for s, _ in running.values()]
+                if any(s.exclusive for s in busy) or (stage.exclusive and busy):
+                    continue
+                due.remove((stage, digest))
+                print(f"[{stage.name}] running {stage.script}")
+                running[executor.submit(run_script, stage, profile)] = (stage, digest)
+
+            if not running:
+                if pending and not ready():
+                    # everything left depends on a failed stage
+                    break
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, digest = running.pop(future)
+                result, seconds, profile_path = future.result()
+                report["stages"][stage.name] = stage_report(
+                    stage, result, seconds, profile_path
+                )
+                if result.stdout.strip():
+                    print(result.stdout.rstrip())
+                if result.returncode != 0:
+                    print(result.stderr.rstrip(), file=sys.stderr)
+                    print(f"[{stage.name}] failed after {seconds:.1f}s")
+                    failed.append(stage.name)
+                    continue
+                print(f"[{stage.name}] done in {seconds:.1f}s")
+                state["stages"][stage.name] = digest
+                done.add(stage.name)
+                rerun.add(stage.name)
+                save_state(state)
+
+    if not dry_run:
+        save_state(state)
+        _write_json(REPORT_PATH, report)
+    skipped = sorted(pending)
+    if skipped:
+        print(f"not run (upstream failed): {', '.join(skipped)}")
+    return not failed and not skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "stages", nargs="*", help="stages to bring up to date (default: all but batch, robustness)"
+    )
+    parser.add_argument("--force", action="store_true", help="rerun stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel stages (default: cpus)")
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "py-spy"],
+        help="profile every stage that runs into .pipeline/profiles/",
+    )
+    args = parser.parse_args()
+    if args.profile == "py-spy" and shutil.which("py-spy") is None:
+        parser.error("--profile py-spy needs py-spy on the PATH (pip install py-spy)")
+    ok = run(
+        args.stages,
+        force=args.force,
+        dry_run=args.dry_run,
+        jobs=args.jobs,
+        profile=args.profile,
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+renders every figure and table of the report from one entry point: the plotting
+modules are imported and PlotStyle is applied once, then the figures are drawn
+in a process pool (Agg backend) whose workers inherit that setup
+outputs: output/figs/{scm,ascm}_combined.png, {scm,ascm}_map.png, ascm_placebo.png,
+         output/tables/donor_characteristics.tex
+usage: python src/report.py [figure ...] [--workers N]
+"""
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import argparse
+import importlib
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src._instrument import record
+from src._plot_style import PlotStyle
+
+results = importlib.import_module("src.5a_plot_results")
+placebo = importlib.import_module("src.5b_plot_placebo")
+donor_map = importlib.import_module("src.5c_plot_donor_map")
+table = importlib.import_module("src.5d_table_cov")
+
+
+# -- PARAMETERS --
+# slowest first (the maps fetch basemap tiles), so the pool stays busy
+FIGURES = {
+    "scm_map": lambda: donor_map.plot_donor_map("scm", _STYLE, _UNITS),
+    "ascm_map": lambda: donor_map.plot_donor_map("ascm", _STYLE, _UNITS),
+    "scm_results": lambda: results.plot_results("scm", _STYLE),
+    "ascm_results": lambda: results.plot_results("ascm", _STYLE),
+    "ascm_placebo": lambda: placebo.plot_placebo(_STYLE),
+    "donor_table": lambda: table.write_table(),
+}
+
+
+# -- WORKERS --
+_STYLE = None
+_UNITS = None
+
+
+def _setup(basemap=False):
+    global _STYLE, _UNITS
+    _STYLE = PlotStyle()
+    _STYLE.apply()
+    _UNITS = donor_map.load_units()
+    if basemap:
+        try:
+            donor_map.prefetch_basemap(_UNITS)
+        except Exception as e:
+            # the map workers retry and fail on their own; the other figures still render
+            print(f"  basemap prefetch failed: {e}")
+
+
+def _render(name):
+    start = time.perf_counter()
+    FIGURES[name]()
+    return name, time.perf_counter() - start
+
+
+def render(names=None, workers=None):
+    """Render the named figures (default: all) and return {name: seconds}.
+
+    A failing figure does not stop the others; RuntimeError names the failures at the end.
+    """
+    names = list(FIGURES) if not names else names
+    unknown = set(names) - set(FIGURES)
+    if unknown:
+        raise ValueError(f"unknown figure(s): {', '.join(sorted(unknown))}")
+
+    # set up once in this process; forked workers inherit modules, rcParams, units
+    # and the stitched basemap
+    _setup(basemap=any(name.endswith("_map") for name in names))
+    if "fork" in multiprocessing.get_all_start_methods():
+        context, initializer = multiprocessing.get_context("fork"), None
+    else:
+        context, initializer = None, _setup
+
+    timings, failed = {}, []
+    with ProcessPoolExecutor(
+        max_workers=workers or min(len(names), multiprocessing.cpu_count()),
+        mp_context=context,
+        initializer=initializer,
+    ) as executor:
+        futures = {executor.submit(_render, name): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                _, seconds = future.result()
+            except Exception as e:
+                print(f"  {name} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                failed.append(name)
+                continue
+            print(f"  {name}: {seconds:.1f}s")
+            record("figure", figure=name, wall_s=round(seconds, 4))
+            timings[name] = seconds
+    if failed:
+        raise RuntimeError(f"failed figure(s): {', '.join(sorted(failed))}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="render all report figures and tables")
+    parser.add_argument("figures", nargs="*", help=f"subset of {', '.join(FIGURES)}")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: cpus)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        render(args.figures, args.workers)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(str(e))
+    print(f"report rendered in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+reference outputs for panel.csv, computed the slow and literal way: augsynth's scm and
+ridge ascm (scm = TRUE, lambda_min_ratio = 1e-8, n_lambda = 20, holdout_length = 1,
+min_1se = TRUE) with scipy's slsqp for every simplex fit and an explicit ridge solve
+for every cv fold and lambda, sharing no code with src/
+outputs: tests/fixtures/augsynth/{scm,ascm}_{weights,att}.csv
+usage: python tests/fixtures/augsynth/make_reference.py
+(make_fixture.R writes the same files with augsynth itself)
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+FIXTURE_DIR = Path(__file__).parent
+TREATMENT_TIME = 0
+LAMBDA_MIN_RATIO = 1e-8
+N_LAMBDA = 20
+
+
+def scm_weights(X0, x1):
+    """min ||x1 - X0'w||^2 over the simplex, rescaled so slsqp works on O(1) numbers."""
+    n = X0.shape[0]
+    scale = np.abs(X0).max()
+    A, b = X0 / scale, x1 / scale
+    result = minimize(
+        lambda w: np.sum((b - A.T @ w) ** 2),
+        np.full(n, 1 / n),
+        jac=lambda w: -2 * A @ (b - A.T @ w),
+        bounds=[(0, 1)] * n,
+        constraints={"type": "eq", "fun": lambda w: w.sum() - 1, "jac": lambda w: np.ones(n)},
+        method="SLSQP",
+        options={"ftol": 1e-16, "maxiter": 10000},
+    )
+    w = np.clip(result.x, 0, None)
+    return w / w.sum()
+
+
+def ridge_delta(X_c, resid, lambda_):
+    """X_c (X_c'X_c + lambda I)^-1 resid, by a direct solve."""
+    T0 = X_c.shape[1]
+    return X_c @ np.linalg.solve(X_c.T @ X_c + lambda_ * np.eye(T0), resid)
+
+
+def ascm_weights(X0, x1):
+    means = X0.mean(axis=0)
+    X_c, x1_c = X0 - means, x1 - means
+    T0 = X_c.shape[1]
+    lambda_max = np.linalg.svd(X_c, compute_uv=False).max() ** 2
+    lambdas = lambda_max * (LAMBDA_MIN_RATIO ** (1 / N_LAMBDA)) ** np.arange(N_LAMBDA + 1)
+
+    # leave-one-period-out cv: refit scm and ridge without period i, predict period i
+    errors = np.empty((T0 - 1, len(lambdas)))
+    for i in range(T0 - 1):
+        keep = np.arange(T0) != i
+        w = scm_weights(X_c[:, keep], x1_c[keep])
+        resid = x1_c[keep] - X_c[:, keep].T @ w
+        for l, lambda_ in enumerate(lambdas):
+            w_ridge = w + ridge_delta(X_c[:, keep], resid, lambda_)
+            errors[i, l] = (x1_c[i] - X_c[:, i] @ w_ridge) ** 2
+
+    mean_err = errors.mean(axis=0)
+    se_err = errors.std(axis=0, ddof=1) / np.sqrt(len(errors))
+    best = np.argmin(mean_err)
+    lambda_ = lambdas[mean_err <= mean_err[best] + se_err[best]].max()
+
+    w = scm_weights(X_c, x1_c)
+    return w + ridge_delta(X_c, x1_c - X_c.T @ w, lambda_)
+
+
+def main():
+    panel = pd.read_csv(FIXTURE_DIR / "panel.csv")
+    wide = panel.pivot(index="hex_id", columns="time", values="trips")
+    treated = panel.loc[panel["unit_type"] == "treated", "hex_id"].iloc[0]
+    donors = wide.drop(index=treated)
+    times = wide.columns.to_numpy()
+    pre = times < TREATMENT_TIME
+    Y0, y1 = donors.to_numpy(dtype=float), wide.loc[treated].to_numpy(dtype=float)
+
+    for model_name, fit in [("scm", scm_weights), ("ascm", ascm_weights)]:
+        weights = fit(Y0[:, pre], y1[pre])
+        pd.DataFrame({"hex_id": donors.index, "weight": weights}).to_csv(
+            FIXTURE_DIR / f"{model_name}_weights.csv", index=False
+        )
+        pd.DataFrame({"time": times, "att": y1 - Y0.T @ weights}).to_csv(
+            FIXTURE_DIR / f"{model_name}_att.csv", index=False
+        )
+
+
+if __name__ == "__main__":
+    main()
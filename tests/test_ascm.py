@@ -0,0 +1,155 @@
+"""
+checks of the native scm / ascm estimator (src/_ascm.py, src/_ridge.py): the simplex
+solver against slsqp, the one-factorization ridge cv against refitting every fold, the
+batched placebos against one fit each, parity with the augsynth fixture in
+tests/fixtures/augsynth/ and, when 4_ascm.R's csv outputs are in models/, with the
+full-size study
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import minimize
+
+from src._ascm import fit_ascm, fit_placebos, simplex_lstsq
+from src._ridge import factorize, lambda_path, loo_predictions
+
+
+def factor_panel(n_units, T, seed=0):
+    """Poisson outcomes around a low-rank factor model, like the trip panels."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(T)
+    factors = np.stack([np.sin(2 * np.pi * t / 52), np.cos(2 * np.pi * t / 52), t / T])
+    level = rng.lognormal(3, 0.5, n_units)
+    mean = level[:, None] * np.clip(1 + rng.normal(0, 0.3, (n_units, 3)) @ factors, 0.05, None)
+    return rng.poisson(mean).astype(float)
+
+
+# -- SIMPLEX SOLVER --
+def slsqp(A, b):
+    """Reference simplex least squares: min ||b - A'w||^2, w >= 0, sum(w) = 1."""
+    n = A.shape[0]
+    result = minimize(
+        lambda w: np.sum((b - A.T @ w) ** 2),
+        np.full(n, 1 / n),
+        jac=lambda w: -2 * A @ (b - A.T @ w),
+        bounds=[(0, 1)] * n,
+        constraints={"type": "eq", "fun": lambda w: w.sum() - 1},
+        method="SLSQP",
+        options={"ftol": 1e-14, "maxiter": 1000},
+    )
+    return result.x
+
+
+@pytest.mark.parametrize("n_donors, T", [(8, 30), (40, 20)])
+def test_simplex_lstsq_matches_slsqp(n_donors, T):
+    Y = factor_panel(n_donors + 3, T, seed=n_donors)
+    A, B = Y[:n_donors], Y[n_donors:].T
+    rng = np.random.default_rng(1)
+    time_mask = rng.random((T, 3)) > 0.2
+
+    W = simplex_lstsq(A, B, time_mask=time_mask)
+    assert np.all(W >= 0)
+    np.testing.assert_allclose(W.sum(axis=0), 1, atol=1e-10)
+    for j in range(B.shape[1]):
+        keep = time_mask[:, j]
+        ref = slsqp(A[:, keep], B[keep, j])
+        loss = np.sum((B[keep, j] - A[:, keep].T @ W[:, j]) ** 2)
+        ref_loss = np.sum((B[keep, j] - A[:, keep].T @ ref) ** 2)
+        # slsqp meets sum(w) = 1 only to ~1e-6, which can buy it a slightly lower loss
+        assert loss <= ref_loss * (1 + 1e-5)
+        np.testing.assert_allclose(W[:, j], ref, atol=1e-4)
+
+        # kkt: equal gradients on the support, no better donor outside it
+        grad = -2 * A[:, keep] @ (B[keep, j] - A[:, keep].T @ W[:, j])
+        support = W[:, j] > 1e-10
+        tol = 1e-8 * np.abs(grad).max()
+        assert np.ptp(grad[support]) <= tol
+        assert np.all(grad[~support] >= grad[support].min() - tol)
+
+
+# -- RIDGE CV --
+@pytest.mark.parametrize("n_donors, T0", [(30, 12), (6, 12)])
+def test_loo_predictions_match_refits(n_donors, T0):
+    X0 = factor_panel(n_donors, T0, seed=T0 + n_donors)
+    rng = np.random.default_rng(2)
+    factor = factorize(X0)
+    X_c = X0 - factor.means
+    folds = T0 - 1
+    resid = rng.normal(0, 10, (folds, T0))
+    lambdas = lambda_path(factor, 1e-4, 6)
+
+    pred = loo_predictions(factor, resid, lambdas)
+
+    # brute force: refit the ridge correction without period i, predict period i
+    for i in range(folds):
+        keep = np.arange(T0) != i
+        X_i = X_c[:, keep]
+        for l, lambda_ in enumerate(lambdas):
+            delta = X_i @ np.linalg.solve(
+                X_i.T @ X_i + lambda_ * np.eye(T0 - 1), resid[i, keep]
+            )
+            np.testing.assert_allclose(pred[i, l], X_c[:, i] @ delta, rtol=1e-6, atol=1e-8)
+
+
+# -- BATCHED PLACEBOS --
+def test_fit_placebos_match_single_fits():
+    Y = factor_panel(25, 40, seed=3)
+    pre = np.arange(40) < 28
+    rows = [0, 7, 24]
+
+    batched = fit_placebos(Y, rows, pre)
+    for gaps, r in zip(batched, rows):
+        single = fit_ascm(np.delete(Y, r, axis=0), Y[r], pre, progfunc="ridge").att
+        np.testing.assert_allclose(gaps, single, rtol=1e-7, atol=1e-6)
+
+
+# -- PARITY WITH AUGSYNTH --
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "augsynth"
+R_OUTPUTS = Path("models")
+
+
+@pytest.mark.parametrize("model_name, progfunc", [("scm", "none"), ("ascm", "ridge")])
+def test_parity_with_augsynth_fixture(model_name, progfunc):
+    """Weights and att on the 8-donor, 30-week study in panel.csv (see make_fixture.R)."""
+    panel = pd.read_csv(FIXTURE_DIR / "panel.csv")
+    wide = panel.pivot(index="hex_id", columns="time", values="trips")
+    treated = panel.loc[panel["unit_type"] == "treated", "hex_id"].iloc[0]
+    Y0 = wide.drop(index=treated).to_numpy(dtype=float)
+    y1 = wide.loc[treated].to_numpy(dtype=float)
+    pre = wide.columns.to_numpy() < 0
+
+    weights = pd.read_csv(FIXTURE_DIR / f"{model_name}_weights.csv")
+    att = pd.read_csv(FIXTURE_DIR / f"{model_name}_att.csv")
+
+    fit = fit_ascm(Y0, y1, pre, progfunc=progfunc)
+    np.testing.assert_array_equal(weights["hex_id"], wide.index.drop(treated))
+    np.testing.assert_allclose(fit.weights, weights["weight"], atol=1e-4)
+    np.testing.assert_allclose(fit.att, att["att"], atol=1e-4 * np.abs(y1).max())
+WIDE_PATH = Path("data/panel_weekly_wide")
+
+
+@pytest.mark.parametrize("model_name, progfunc", [("scm", "none"), ("ascm", "ridge")])
+def test_parity_with_augsynth(model_name, progfunc):
+    """Full-size study: refit on the donors of 4_ascm.R's outputs and compare."""
+    paths = [R_OUTPUTS / f"{model_name}_{t}.csv" for t in ("weights", "timeseries")]
+    if not all(p.exists() for p in paths) or not WIDE_PATH.exists():
+        pytest.skip("run src/4_ascm.R first: no augsynth outputs in models/")
+    from src._panel import load_wide
+
+    weights = pd.read_csv(paths[0])
+    timeseries = pd.read_csv(paths[1])
+
+    panel = load_wide(WIDE_PATH)
+    weeks = panel.weeks(timeseries["time"].min(), timeseries["time"].max())
+    row_of = {hex_id: i for i, hex_id in enumerate(panel.hex_id)}
+    Y0 = panel.trips[[row_of[h] for h in weights["hex_id"]]][:, weeks].astype(float)
+    y1 = timeseries["observed"].to_numpy(dtype=float)
+    pre = panel.time[weeks] < 0
+
+    fit = fit_ascm(Y0, y1, pre, progfunc=progfunc)
+    scale = np.abs(y1).max()
+    np.testing.assert_allclose(fit.synthetic, timeseries["synthetic"], atol=1e-3 * scale)
+    np.testing.assert_allclose(fit.weights, weights["weight"], atol=1e-3)
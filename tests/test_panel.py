@@ -0,0 +1,51 @@
+"""
+checks of the panel helpers (src/_panel.py): an incremental update of a binned panel
+(bin_of, merge_incremental) equals binning and completing all days again
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src._panel import bin_days, bin_of, complete_panel, merge_incremental
+
+TREATMENT_DATE = "2022-11-21"
+
+
+def random_days(seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-11-21", "2023-03-01")
+    daily = pd.DataFrame(
+        {
+            "hex_id": rng.integers(0, 40, 3000),
+            "date": rng.choice(dates, 3000),
+            "trips": rng.poisson(5, 3000).astype(float),
+        }
+    )
+    return daily.groupby(["hex_id", "date"], as_index=False)["trips"].sum()
+
+
+def full_panel(daily, resolution, hex_info):
+    counts = bin_days(daily, TREATMENT_DATE, resolution)
+    times = range(counts["time"].min(), counts["time"].max() + 1)
+    return complete_panel(counts, counts["hex_id"].unique(), times, hex_info)
+
+
+@pytest.mark.parametrize("resolution", ["week", "month", 14])
+def test_incremental_bins_match_full_build(resolution):
+    daily = random_days()
+    hex_info = pd.DataFrame({"hex_id": np.arange(40), "unit_type": "donor"})
+    since = pd.Timestamp("2022-12-07")
+    old = full_panel(daily[daily["date"] < since], resolution, hex_info)
+
+    watermark = bin_of([since], TREATMENT_DATE, resolution)[0]
+    new_days = daily[bin_of(daily["date"], TREATMENT_DATE, resolution) >= watermark]
+    counts = bin_days(new_days, TREATMENT_DATE, resolution)
+    merged = merge_incremental(old, counts, watermark, hex_info)
+
+    expected = full_panel(daily, resolution, hex_info)
+    pd.testing.assert_frame_equal(
+        merged.sort_values(["hex_id", "time"], ignore_index=True)[["hex_id", "time", "trips"]],
+        expected.sort_values(["hex_id", "time"], ignore_index=True)[["hex_id", "time", "trips"]],
+        check_dtype=False,
+    )
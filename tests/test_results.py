@@ -0,0 +1,49 @@
+"""
+checks of the results store (src/_results.py): readers take every table from the last
+completed run, whatever its id, and pruning keeps only the newest completed runs
+"""
+
+import pandas as pd
+
+from src._results import complete_run, completed_runs, latest_run, read_table, write_tables
+
+
+def tables(value):
+    return {name: pd.DataFrame({"value": [value]}) for name in ("att", "weights")}
+
+
+def test_latest_completed_run_not_latest_id(tmp_path):
+    write_tables(tables(1), tmp_path, "scm", "zzz-first")
+    complete_run(tmp_path, "zzz-first", ["scm"])
+    write_tables(tables(2), tmp_path, "scm", "aaa-second")
+    complete_run(tmp_path, "aaa-second", ["scm"])
+
+    assert latest_run(tmp_path, "scm") == "aaa-second"
+    assert read_table(tmp_path, "att", "scm")["value"].item() == 2
+
+
+def test_crashed_run_does_not_mix_tables(tmp_path):
+    write_tables(tables(1), tmp_path, "scm", "run-1")
+    complete_run(tmp_path, "run-1", ["scm"])
+    # a second run that dies after writing one table
+    write_tables({"att": pd.DataFrame({"value": [2]})}, tmp_path, "scm", "run-2")
+
+    assert read_table(tmp_path, "att", "scm")["value"].item() == 1
+    assert read_table(tmp_path, "weights", "scm")["value"].item() == 1
+
+    # rewriting a completed run makes it incomplete until it completes again
+    write_tables(tables(3), tmp_path, "scm", "run-1")
+    assert latest_run(tmp_path, "scm") is None
+
+
+def test_prune_keeps_newest_completed_runs(tmp_path):
+    for run in ["a", "b", "c"]:
+        write_tables(tables(0), tmp_path, "scm", run)
+        complete_run(tmp_path, run, ["scm"])
+    write_tables(tables(0), tmp_path, "scm", "crashed")
+    write_tables(tables(0), tmp_path, "scm", "d")
+    complete_run(tmp_path, "d", ["scm"], keep=2)
+
+    assert [run["run_id"] for run in completed_runs(tmp_path)] == ["c", "d"]
+    stored = sorted(p.name for p in (tmp_path / "results" / "att" / "model=scm").iterdir())
+    assert stored == ["run_id=c", "run_id=d"]